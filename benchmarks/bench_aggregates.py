@@ -0,0 +1,99 @@
+"""Benchmark of the occupancy aggregates at 1M persons and 100k rooms.
+
+Compares the columnar aggregates with loops over the database objects.
+Runs in a temporary directory, the program data is not touched.
+
+Usage: python -m benchmarks.bench_aggregates
+"""
+
+import os
+import random
+import tempfile
+import time
+
+from dorm_accounting import aggregates
+from dorm_accounting.columns import numpy
+from dorm_accounting.database import DataBase
+
+ROOMS = 100_000
+PERSONS = 1_000_000
+
+
+def timed(title, function, *args):
+    start = time.perf_counter()
+    result = function(*args)
+    elapsed = time.perf_counter() - start
+    print(f'{title:<40} {elapsed * 1000:>10.1f} ms')
+    return result
+
+
+def fill(db):
+    with db.transaction():
+        room_keys = db.insert_elements(
+            'rooms',
+            [
+                {
+                    'number': number + 100,
+                    'kind': random.choice('mfs'),
+                    'capacity': random.randint(8, 12),
+                }
+                for number in range(ROOMS)
+            ],
+        )
+        person_keys = db.insert_elements(
+            'persons',
+            [
+                {
+                    'name': f'Person {number}',
+                    'gender': random.choice('mf'),
+                    'age': random.randint(17, 30),
+                    'phone': '',
+                    'passport': '',
+                }
+                for number in range(PERSONS)
+            ],
+        )
+
+        for number, key in enumerate(person_keys[: ROOMS * 8]):
+            db.get_room(room_keys[number % ROOMS]).add_occupant(key)
+
+
+def loop_free_beds(db):
+    beds = {}
+    for room in db.get_elements('rooms').values():
+        beds[room.kind] = beds.get(room.kind, 0) + room.space
+    return beds
+
+
+def loop_ages(db):
+    ages = {}
+    for person in db.get_elements('persons').values():
+        ages[person.age] = ages.get(person.age, 0) + 1
+    return ages
+
+
+def main():
+    random.seed(0)
+    os.chdir(tempfile.mkdtemp())
+
+    print('NumPy:', 'yes' if numpy is not None else 'no (array fallback)')
+
+    db = DataBase()
+
+    timed(f'fill ({ROOMS} rooms, {PERSONS} persons)', fill, db)
+    timed('build columns', db.build_indexes, 'rooms', ['columns'])
+    timed('build columns', db.build_indexes, 'persons', ['columns'])
+
+    timed('loop: free beds by kind', loop_free_beds, db)
+    timed('columns: free beds by kind', aggregates.get_free_beds_by_kind)
+    timed('loop: age distribution', loop_ages, db)
+    timed('columns: age distribution', aggregates.get_age_distribution)
+    timed('columns: gender counts', aggregates.get_gender_counts)
+    timed(
+        'columns: gender balance by floor',
+        aggregates.get_gender_balance_by_floor,
+    )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,67 @@
+"""Benchmark of the bulk allocation of 50k persons into 10k rooms.
+
+Runs in a temporary directory, the program data is not touched.
+
+Usage: python -m benchmarks.bench_allocation
+"""
+
+import os
+import random
+import tempfile
+import time
+
+from dorm_accounting.allocation import plan_allocation
+from dorm_accounting.database import DataBase
+
+ROOMS = 10_000
+PERSONS = 50_000
+
+
+def timed(title, function, *args):
+    start = time.perf_counter()
+    result = function(*args)
+    elapsed = time.perf_counter() - start
+    print(f'{title:<40} {elapsed * 1000:>10.1f} ms')
+    return result
+
+
+def fill(db):
+    with db.transaction():
+        for number in range(ROOMS):
+            db.create_data(
+                'rooms',
+                {
+                    'number': number + 1,
+                    'kind': random.choice('mfs'),
+                    'capacity': random.randint(2, 6),
+                },
+            )
+
+        for number in range(PERSONS):
+            db.create_data(
+                'persons',
+                {
+                    'name': f'Person {number}',
+                    'gender': random.choice('mf'),
+                    'age': random.randint(17, 30),
+                    'phone': '',
+                    'passport': '',
+                },
+            )
+
+
+def main():
+    random.seed(0)
+    os.chdir(tempfile.mkdtemp())
+
+    db = DataBase()
+
+    timed(f'fill ({ROOMS} rooms, {PERSONS} persons)', fill, db)
+    plan = timed('plan', plan_allocation)
+    moved = timed('commit', plan.commit)
+
+    print(f'moved in: {moved}, left without a room: {len(plan.unplaced)}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,48 @@
+"""Benchmark of the database key allocator at 1M keys.
+
+Usage: python -m benchmarks.bench_keys
+"""
+
+import random
+import time
+
+from dorm_accounting.keys import KeyAllocator
+
+KEYS = 1_000_000
+HOLES = 100_000
+OPERATIONS = 100_000
+
+
+def timed(title, function, *args):
+    start = time.perf_counter()
+    result = function(*args)
+    elapsed = time.perf_counter() - start
+    print(f'{title:<40} {elapsed * 1000:>10.1f} ms')
+    return result
+
+
+def main():
+    random.seed(0)
+
+    holes = set(random.sample(range(KEYS), HOLES))
+    used = [key for key in range(KEYS) if key not in holes]
+
+    allocator = timed(f'rebuild ({KEYS} keys)', KeyAllocator, used)
+
+    def allocate():
+        return [allocator.allocate() for _ in range(OPERATIONS)]
+
+    def release(keys):
+        for key in keys:
+            allocator.release(key)
+
+    keys = timed(f'allocate x{OPERATIONS}', allocate)
+    assert keys == sorted(holes)[:OPERATIONS]
+
+    random.shuffle(keys)
+    timed(f'release x{OPERATIONS}', release, keys)
+    timed(f'allocate_many({OPERATIONS})', allocator.allocate_many, OPERATIONS)
+
+
+if __name__ == '__main__':
+    main()
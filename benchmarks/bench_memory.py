@@ -0,0 +1,72 @@
+"""Memory per record of slotted Room / Person objects at 100k records.
+
+Compares them with plain __dict__ objects holding the same fields (the
+layout used before __slots__, with a per-instance field list).
+
+Usage: python -m benchmarks.bench_memory
+"""
+
+import tracemalloc
+
+from dorm_accounting.database import Person, Room
+
+RECORDS = 100_000
+
+
+class DictRoom:
+    def __init__(self, key, number, kind, capacity, occupants):
+        self.key = key
+        self.number = number
+        self.kind = kind
+        self.capacity = capacity
+        self.occupants = occupants
+        self.space = capacity - len(occupants)
+        self.properties_to_jsonify = [
+            'key', 'number', 'kind', 'capacity', 'occupants'
+        ]
+
+
+class DictPerson:
+    def __init__(self, key, name, gender, age, phone, passport, room=0):
+        self.key = key
+        self.room = room
+        self.name = name
+        self.gender = gender
+        self.age = age
+        self.phone = phone
+        self.passport = passport
+        self.properties_to_jsonify = [
+            'key', 'room', 'name', 'gender', 'age', 'phone', 'passport'
+        ]
+
+
+def measure(title, factory, make_arguments):
+    # Field values are created up front so only the objects are measured
+    arguments = [make_arguments(number) for number in range(RECORDS)]
+
+    tracemalloc.start()
+    objects = [factory(*args) for args in arguments]
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    print(f'{title:<40} {size / len(objects):>10.1f} bytes/record')
+    return objects
+
+
+def room_arguments(number):
+    return str(number), number, 'm', 4, []
+
+
+def person_arguments(number):
+    return str(number), f'Person {number}', 'm', 20, '', ''
+
+
+def main():
+    measure('rooms, __dict__', DictRoom, room_arguments)
+    measure('rooms, __slots__', Room, room_arguments)
+    measure('persons, __dict__', DictPerson, person_arguments)
+    measure('persons, __slots__', Person, person_arguments)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,79 @@
+"""Benchmark of sorted pages at 500k persons.
+
+Compares sorting the whole part (the old SortingFrame rule) with a page
+read from the sorted indexes, and times index upkeep on edits.
+Runs in a temporary directory, the program data is not touched.
+
+Usage: python -m benchmarks.bench_sorting
+"""
+
+import os
+import random
+import tempfile
+import time
+
+from dorm_accounting.database import DataBase
+
+PERSONS = 500_000
+PAGE = 50
+# Below the checkpoint interval, so no snapshot is written while editing
+EDITS = 500
+
+
+def timed(title, function, *args):
+    start = time.perf_counter()
+    result = function(*args)
+    elapsed = time.perf_counter() - start
+    print(f'{title:<40} {elapsed * 1000:>10.1f} ms')
+    return result
+
+
+def fill(db):
+    db.insert_elements(
+        'persons',
+        [
+            {
+                'name': f'Person {random.randrange(PERSONS)}',
+                'gender': random.choice('mf'),
+                'age': random.randint(17, 30),
+                'phone': '',
+                'passport': '',
+            }
+            for _ in range(PERSONS)
+        ],
+    )
+
+
+def sort_all(db):
+    items = db.get_elements('persons').items()
+    return sorted(items, key=lambda x: x[1].name, reverse=True)
+
+
+def read_page(db):
+    return list(db.query('persons', order_by='-name', limit=PAGE))
+
+
+def edit(db):
+    keys = random.sample(list(db.get_elements('persons')), EDITS)
+    for key in keys:
+        params = db.get_person(key).jsonify()
+        params['name'] = f'Renamed {key}'
+        db.update_data('persons', key, params)
+
+
+def main():
+    random.seed(0)
+    os.chdir(tempfile.mkdtemp())
+
+    db = DataBase()
+
+    timed(f'fill ({PERSONS} persons)', fill, db)
+    timed('sort everything', sort_all, db)
+    timed('build name index', db.build_indexes, 'persons', ['name'])
+    timed(f'page of {PAGE} from the index', read_page, db)
+    timed(f'{EDITS} renames with index upkeep', edit, db)
+    timed(f'page of {PAGE} from the index', read_page, db)
+
+
+if __name__ == '__main__':
+    main()
@@ -4,6 +4,7 @@ from PySide6 import QtGui as qg, QtWidgets as qw
 
 from .app_windows import *
 from .database import *
+from .styles import read_style_sheet
 
 
 def main_cli():
@@ -18,20 +19,23 @@ def main_cli():
     app = qw.QApplication(sys.argv)
 
     # Window look properties
-    with open('dorm_accounting/style.css', 'r', encoding='UTF-8') as css:
-        style = css.read()
-    app.setStyleSheet(style)
+    app.setStyleSheet(read_style_sheet())
     app.setWindowIcon(qg.QIcon(qg.QPixmap('dorm_accounting/favicon.ico')))
 
-    # Main window
-    main_window = Window_Rooms()
-    app.main_window = main_window
-    main_window.show()
-
-    # If not authorized show password window
-    if not db.authorized:
-        main_window.hide()
-        pass_window = Window_Password(main_window)
+    # Main window, its rooms are filled in chunks after it is shown
+    def open_main_window():
+        main_window = Window_Rooms()
+        app.main_window = main_window
+        main_window.show()
+
+    # If not authorized show password window, the main window is not
+    # built until the password is accepted
+    if db.authorized:
+        open_main_window()
+    else:
+        pass_window = Window_Password()
+        pass_window.authorized.connect(open_main_window)
+        app.pass_window = pass_window
         pass_window.show()
 
     # Launch the application
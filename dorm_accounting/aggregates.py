@@ -0,0 +1,93 @@
+"""Occupancy statistics over the columnar mirror of the database.
+
+Vectorized with NumPy when it is installed (pip install numpy), plain
+array loops otherwise.
+"""
+
+from .columns import GENDERS, KINDS, NO_ROOM, numpy
+from .database import DataBase
+
+# Room number // FLOOR_SIZE is the floor: room 312 is on floor 3
+FLOOR_SIZE = 100
+
+
+def decode(values: dict, names: tuple) -> dict:
+    return {name: values.get(code, 0) for code, name in enumerate(names)}
+
+
+def get_capacity_by_kind() -> dict:
+    """Total beds in rooms of every kind."""
+    rooms = DataBase().get_columns('rooms')
+    return decode(rooms.sum_by('kind', 'capacity'), KINDS)
+
+
+def get_free_beds_by_kind() -> dict:
+    """Free beds in rooms of every kind."""
+    rooms = DataBase().get_columns('rooms')
+    return decode(rooms.sum_by('kind', 'space'), KINDS)
+
+
+def get_gender_counts() -> dict:
+    """Number of persons of every gender."""
+    persons = DataBase().get_columns('persons')
+    return decode(persons.count_by('gender'), GENDERS)
+
+
+def get_age_distribution() -> dict:
+    """Number of persons of every age, in age order."""
+    persons = DataBase().get_columns('persons')
+    return dict(sorted(persons.count_by('age').items()))
+
+
+def get_gender_balance_by_floor() -> dict:
+    """Number of persons of every gender living on every floor."""
+    db = DataBase()
+    rooms = db.get_columns('rooms')
+    persons = db.get_columns('persons')
+
+    room_keys = rooms.get_column('key')
+    room_numbers = rooms.get_column('number')
+    person_rooms = persons.get_column('room')
+    genders = persons.get_column('gender')
+
+    if numpy is None:
+        floors = {
+            key: number // FLOOR_SIZE
+            for key, number in zip(room_keys, room_numbers)
+        }
+
+        counts = {}
+        for room, gender in zip(person_rooms, genders):
+            if room != NO_ROOM:
+                code = floors[room] * len(GENDERS) + gender
+                counts[code] = counts.get(code, 0) + 1
+    else:
+        floors = numpy.zeros(
+            room_keys.max() + 1 if len(room_keys) else 0, dtype=numpy.int64
+        )
+        floors[room_keys] = room_numbers // FLOOR_SIZE
+
+        housed = person_rooms != NO_ROOM
+        codes = floors[person_rooms[housed]] * len(GENDERS) + genders[housed]
+
+        bins = numpy.bincount(codes)
+        nonzero = numpy.flatnonzero(bins)
+        counts = dict(zip(nonzero.tolist(), bins[nonzero].tolist()))
+
+    balance = {}
+    for code, count in sorted(counts.items()):
+        floor, gender = divmod(code, len(GENDERS))
+        balance.setdefault(floor, dict.fromkeys(GENDERS, 0))
+        balance[floor][GENDERS[gender]] = count
+
+    return balance
+
+
+__all__ = [
+    'FLOOR_SIZE',
+    'get_age_distribution',
+    'get_capacity_by_kind',
+    'get_free_beds_by_kind',
+    'get_gender_balance_by_floor',
+    'get_gender_counts',
+]
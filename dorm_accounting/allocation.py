@@ -0,0 +1,97 @@
+from .database import DataBase
+
+
+class AllocationPlan:
+    """Assignment of unhoused persons to rooms with free beds.
+
+    The plan is only a preview until commit() is called.
+    """
+
+    def __init__(self, assignments: list, unplaced: list) -> None:
+        # (person key, room key) pairs
+        self.assignments = assignments
+        # Keys of persons left without a room
+        self.unplaced = unplaced
+
+    def __len__(self) -> int:
+        return len(self.assignments)
+
+    def get_room_counts(self) -> dict:
+        """Number of persons planned for each room key."""
+        counts = {}
+
+        for _, room_key in self.assignments:
+            counts[room_key] = counts.get(room_key, 0) + 1
+
+        return counts
+
+    def commit(self) -> int:
+        """Move the persons in as a single database transaction.
+
+        Assignments that are no longer valid (the person got a room, the
+        room is gone or full) are skipped. Returns the number of persons
+        moved in.
+        """
+        db = DataBase()
+        moved = 0
+
+        with db.transaction():
+            for person_key, room_key in self.assignments:
+                person = db.get_person(person_key)
+                room = db.get_room(room_key)
+
+                if person is None or room is None or person.room:
+                    continue
+
+                if room.space <= 0 or room.kind not in (person.gender, 's'):
+                    continue
+
+                room.add_occupant(person_key)
+                moved += 1
+
+        return moved
+
+
+def plan_allocation() -> AllocationPlan:
+    """Plan moving every person with no room into compatible rooms.
+
+    Persons are taken in key order. Rooms of the person's gender are
+    filled first (in room number order), then shared rooms, whose free
+    beds are shared by both genders.
+    """
+    db = DataBase()
+
+    unhoused = db.lookup('persons', 'room', 0)
+    space = {}
+    assignments = []
+    unplaced = []
+
+    for gender in ('m', 'f'):
+        persons = sorted(
+            unhoused & db.lookup('persons', 'gender', gender), key=int
+        )
+
+        rooms = [db.get_room(key) for key in db.find_vacant_rooms(gender)]
+        rooms.sort(key=lambda room: (room.kind == 's', room.number))
+
+        persons = iter(persons)
+        for room in rooms:
+            room_key = room.key
+            free = space.get(room_key, room.space)
+            if free <= 0:
+                continue
+
+            for person_key in persons:
+                assignments.append((person_key, room_key))
+                free -= 1
+                if not free:
+                    break
+
+            space[room_key] = free
+
+        unplaced.extend(persons)
+
+    return AllocationPlan(assignments, unplaced)
+
+
+__all__ = ['AllocationPlan', 'plan_allocation']
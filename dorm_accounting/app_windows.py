@@ -6,6 +6,7 @@ from ctypes import windll
 from PySide6 import QtCore as qc
 from PySide6.QtWidgets import (
     QButtonGroup as BGroup,
+    QCheckBox as CheckBox,
     QDialog as Dialog,
     QFrame as Frame,
     QGridLayout as LGrid,
@@ -15,16 +16,29 @@ from PySide6.QtWidgets import (
     QMainWindow as TopWindow,
     QMenuBar as MenuBar,
     QMessageBox as MBox,
+    QProgressBar as Progress,
     QPushButton as Button,
     QRadioButton as RButton,
     QScrollArea as Scroll,
     QSpinBox as Spin,
     QVBoxLayout as LVBox,
+    QWidget as Widget,
 )
 
+from .allocation import plan_allocation
 from .custom_inputs import *
 from .custom_messages import *
 from .database import *
+from .events import get_keys, UPDATED
+from .item_models import (
+    get_person_row,
+    PERSON_ROW_FIELDS,
+    PersonPageTableView,
+    PersonTableView,
+    RoomCardView,
+)
+from .query import Contains, In, match_where, NotIn, Range
+from .workers import BackgroundQuery
 
 # ------------------------------------------------------------------
 # Getting the current screen size
@@ -69,11 +83,19 @@ class ViewItem(Frame):
 
     def select_self(self) -> None:
         """Toggle item style (selected/unselected)."""
-        if self.rbutton.isChecked():
-            self.setProperty('selected', True)
+        self.setProperty('selected', self.rbutton.isChecked())
+        self.repolish()
+
+    def set_selected(self, selected: bool) -> None:
+        """Check or uncheck the item's radio button."""
+        if self.rbutton.isChecked() == selected:
             return
 
-        self.setProperty('selected', False)
+        # An exclusive group does not let its checked button be unchecked
+        group = self.rbutton.group()
+        group.setExclusive(False)
+        self.rbutton.setChecked(selected)
+        group.setExclusive(True)
 
     # ------------------------------------------------------------------
 
@@ -82,6 +104,29 @@ class ViewItem(Frame):
         """Set item data. Should be redefined in derived classes."""
         self.data = data.copy()
 
+    def set_properties(self, element) -> None:
+        """Set style properties of the item from the element."""
+
+    def update_item(self, element) -> None:
+        """Show the current element data without rebuilding the item."""
+        self.element = element
+        self.set_data(element)
+
+        for key, label in self.labels.items():
+            label.setText(self.LABEL_SCHEME[key].format(self.data[key]))
+
+        self.set_properties(element)
+        self.repolish()
+
+    def repolish(self) -> None:
+        """Apply the style of the changed properties to the item and its
+        contents (the style sheet selects them by the item properties)."""
+        style = self.style()
+
+        for widget in [self, *self.findChildren(Widget)]:
+            style.unpolish(widget)
+            style.polish(widget)
+
     # ------------------------------------------------------------------
 
     def construct_rbutton(self) -> RButton:
@@ -107,6 +152,8 @@ class ViewItem(Frame):
             new_label.setAlignment(qc.Qt.AlignCenter)
             contents.append(new_label)
 
+            self.labels[key] = new_label
+
         return contents
 
     def construct_item(self) -> None:
@@ -137,58 +184,12 @@ class ViewItem(Frame):
 
         self.element = element
         self.set_data(element)
+        self.set_properties(element)
 
-        self.construct_item()
-
-    # ------------------------------------------------------------------
-
-
-class RoomItem(ViewItem):
-    ITEM_SCHEME = 'card'
-
-    LABEL_SCHEME = {
-        'number': 'Номер: {}',
-        'kind': 'Тип комнаты: {}',
-        'space': 'Свободно мест: {}',
-    }
-
-    ROOM_TYPES = {'s': 'Общая', 'f': 'Женская', 'm': 'Мужская'}
-
-    # ------------------------------------------------------------------
-
-    def open_occupants(self) -> None:
-        window = Window_RoomOccupantsView(self.parent(), self.element)
-        window.show()
+        # Labels of the data fields, by field
+        self.labels = {}
 
-    # ------------------------------------------------------------------
-
-    def set_data(self, element: Room) -> None:
-        """Set room item data to match the item scheme."""
-        raw_data = {}
-
-        raw_data['number'] = element.number
-        raw_data['kind'] = self.ROOM_TYPES.get(element.kind)
-        raw_data['space'] = element.space
-
-        self.data = raw_data
-
-    def construct_contents(self) -> list:
-        """Construct room item contents (Occupant button added)."""
-        contents = super().construct_contents()
-
-        b_occupants = Button('Жильцы')
-        b_occupants.clicked.connect(self.open_occupants)
-
-        contents.append(b_occupants)
-
-        return contents
-
-    def __init__(self, parent: 'ObjectView', room: Room) -> None:
-        super().__init__(parent, room)
-
-        self.setProperty('space', room.space)
-        self.setProperty('kind', room.kind)
-        print(room)
+        self.construct_item()
 
     # ------------------------------------------------------------------
 
@@ -203,8 +204,6 @@ class PersonItem(ViewItem):
         'phone': 'Телефон: {}',
     }
 
-    GENDERS = {'f': 'Не заселена', 'm': 'Не заселён'}
-
     def construct_contents(self) -> list:
         contents = []
 
@@ -214,27 +213,21 @@ class PersonItem(ViewItem):
             new_label.setAlignment(qc.Qt.AlignLeft | qc.Qt.AlignVCenter)
             contents.append(new_label)
 
+            self.labels[key] = new_label
+
         return contents
 
+    def set_properties(self, element: Person) -> None:
+        self.setProperty('gender', element.gender)
+
     def __init__(self, parent: 'ObjectView', person: Person) -> None:
         super().__init__(parent, person)
 
-        self.setProperty('gender', person.gender)
-
     # ------------------------------------------------------------------
 
     def set_data(self, element: Person):
         """Set person item data."""
-        raw_data = {}
-
-        raw_data['key'] = int(element.key) + 1
-        raw_data['name'] = element.name
-        raw_data['phone'] = element.phone
-        raw_data['gender'] = self.GENDERS.get(element.gender)
-        room = DataBase().get_room(element.room)
-        raw_data['room'] = room.number if room else raw_data['gender']
-
-        self.data = raw_data
+        self.data = dict(zip(PERSON_ROW_FIELDS, get_person_row(element)))
 
     # ------------------------------------------------------------------
 
@@ -246,6 +239,10 @@ class ObjectView(Frame):
     SPACING = 7
     MARGINS = 7, 7, 7, 7
 
+    item_clicked = qc.Signal(str)
+
+    PART = ''
+
     VIEW_ITEM = ViewItem
 
     VIEW_COLS = 1
@@ -254,26 +251,30 @@ class ObjectView(Frame):
 
     def clear_view(self):
         for item in self.items:
-            print(f'{item=}')
             item.deleteLater()
 
-        self.items = list()
+        self.place_items([])
+        self.items_by_key = dict()
 
     def fill_view(self):
-        data = self.data
+        query = DataBase().query(self.PART, self.where, self.order_by)
 
-        for key, element in self.sort_data(data.items()):
-            new_item = self.VIEW_ITEM(self, element)
-            self.add_item(new_item)
-
-            if key == self.selected_key:
-                new_item.rbutton.toggle()
-                new_item.selected = True
+        self.place_items([self.make_item(element) for _, element in query])
 
     def update_view(self):
         self.clear_view()
         self.fill_view()
 
+    def make_item(self, element):
+        new_item = self.VIEW_ITEM(self, element)
+        new_item.order_value = self.get_order_value(element)
+
+        self.items_by_key[element.key] = new_item
+
+        new_item.set_selected(element.key == self.selected_key)
+
+        return new_item
+
     def add_item(self, item):
         count_items = len(self.items)
 
@@ -283,27 +284,130 @@ class ObjectView(Frame):
         self.l_view.addWidget(item, current_row, current_col)
         self.items.append(item)
 
+    def place_items(self, items: list):
+        """
+        Lay the items out in the given order, moving only the items
+        from the first changed position on
+        """
+        start = 0
+        while (
+            start < min(len(items), len(self.items))
+            and items[start] is self.items[start]
+        ):
+            start += 1
+
+        l_view = self.l_view
+        while l_view.count() > start:
+            l_view.takeAt(l_view.count() - 1)
+
+        self.items = items[:start]
+        for item in items[start:]:
+            self.add_item(item)
+
     # ------------------------------------------------------------------
 
-    def set_data(self, data: dict):
-        self.data = data
+    def get_order_value(self, element):
+        field = self.order_by.lstrip('-')
+
+        if field == 'key':
+            return int(element.key)
+
+        return getattr(element, field)
+
+    def get_changed_keys(self, events: list) -> set:
+        """Keys of the shown part whose items may have to change."""
+        return get_keys(events, self.PART)
+
+    def apply_changes(self, events: list):
+        """
+        Apply committed database changes to the affected items only,
+        the other items are not touched
+        """
+        keys = self.get_changed_keys(events)
+        if not keys:
+            return
+
+        db_part = DataBase().get_elements(self.PART)
+        reorder = False
+
+        for key in keys:
+            element = db_part.get(key)
+            item = self.items_by_key.get(key)
+
+            if element is None or not match_where(self.where, element):
+                if item is not None:
+                    self.items_by_key.pop(key).deleteLater()
+                    reorder = True
+                continue
+
+            if item is None:
+                self.make_item(element)
+                reorder = True
+                continue
+
+            item.update_item(element)
+
+            order_value = self.get_order_value(element)
+            if order_value != item.order_value:
+                item.order_value = order_value
+                reorder = True
+
+        if not reorder:
+            return
+
+        query = DataBase().query(self.PART, self.where, self.order_by)
+        self.place_items(
+            [
+                self.items_by_key[key]
+                for key, _ in query
+                if key in self.items_by_key
+            ]
+        )
+
+    def showEvent(self, event):
+        DataBase().subscribe(self.apply_changes)
+
+        # Changes made while hidden were not applied
+        if self.stale:
+            self.stale = False
+            self.update_view()
+
+        super().showEvent(event)
+
+    def hideEvent(self, event):
+        DataBase().unsubscribe(self.apply_changes)
+        self.stale = True
+
+        super().hideEvent(event)
+
+    # ------------------------------------------------------------------
+
+    def set_filter(self, where: dict):
+        self.where = where
         self.update_view()
 
-    def set_sorting_rule(self, rule):
-        self.sort_data = rule
+    def set_order_by(self, order_by: str):
+        self.order_by = order_by
 
     # ------------------------------------------------------------------
 
     def select_item(self, key):
+        """Move the selection, only the two items involved are restyled."""
+        previous_item = self.items_by_key.get(self.selected_key)
+        if previous_item is not None:
+            previous_item.set_selected(False)
+
         self.selected_key = key
 
+        item = self.items_by_key.get(key)
+        if item is not None:
+            item.set_selected(True)
+
     def deselect_item(self):
-        self.selected_key = None
+        self.select_item(None)
 
     def get_selected_item(self):
-        for key, value in self.data.items():
-            if self.selected_key == key:
-                return value
+        return DataBase().get_elements(self.PART).get(self.selected_key)
 
     # ------------------------------------------------------------------
 
@@ -328,7 +432,7 @@ class ObjectView(Frame):
         self.construct_layout()
         self.construct_scroll()
 
-    def __init__(self, parent=None):
+    def __init__(self, parent=None, where: dict = None):
         super().__init__(parent=parent)
 
         # ------------------------------------------------------------------
@@ -336,13 +440,21 @@ class ObjectView(Frame):
         self.selected_key = None
 
         self.items = []
-        self.data = {}
+        self.items_by_key = {}
+
+        # Items are not updated while the view is hidden
+        self.stale = False
 
-        self.sort_data = lambda it: sorted(it, key=lambda x: x[1].key)
+        # Query of the shown objects
+        self.where = where or {}
+        self.order_by = 'key'
 
         # ------------------------------------------------------------------
 
         self.rbutton_group = BGroup()
+        self.rbutton_group.buttonClicked.connect(
+            lambda button: self.item_clicked.emit(button.key)
+        )
 
         self.construct_view()
 
@@ -353,17 +465,23 @@ class ObjectView(Frame):
     # ------------------------------------------------------------------
 
 
-class RoomView(ObjectView):
-    VIEW_ITEM = RoomItem
-
-    VIEW_COLS = 6
-
-
 class PersonView(ObjectView):
+    PART = 'persons'
+
     VIEW_ITEM = PersonItem
 
     VIEW_COLS = 1
 
+    def get_changed_keys(self, events: list) -> set:
+        """Persons changed and persons of updated rooms (room number)."""
+        keys = super().get_changed_keys(events)
+
+        db = DataBase()
+        for room_key in get_keys(events, 'rooms', UPDATED):
+            keys |= db.lookup('persons', 'room', room_key)
+
+        return keys
+
 
 # ------------------------------------------------------------------
 
@@ -419,21 +537,38 @@ class SortingFrame(Frame):
     }
     """
 
-    def get_sorting_rule(self):
-        def custom_sorted(rules):
-            key = lambda x: getattr(x[1], rules[0])
-
-            if rules[1]:
-                return lambda it: reversed(sorted(it, key=key))
-
-            return lambda it: sorted(it, key=key)
+    # Queries quicker than this do not flash the busy indicator
+    BUSY_DELAY_MS = 200
 
+    def get_order_by(self):
+        """Field to order by, "-field" for descending order."""
         param = self.param_box.currentData()
         order = self.order_box.currentData()
 
-        rules = (param, order)
+        return f'-{param}' if order else param
+
+    def set_busy(self, busy: bool):
+        """Show the busy indicator while the view's query runs."""
+        if busy:
+            self.busy_timer.start()
+            return
 
-        return custom_sorted(rules)
+        self.busy_timer.stop()
+        self.progress.hide()
+
+    def construct_progress(self):
+        progress = self.progress = Progress()
+        # No range: the indicator only shows that the query runs
+        progress.setRange(0, 0)
+        progress.setTextVisible(False)
+        progress.hide()
+
+        timer = self.busy_timer = qc.QTimer(self)
+        timer.setSingleShot(True)
+        timer.setInterval(self.BUSY_DELAY_MS)
+        timer.timeout.connect(progress.show)
+
+        return progress
 
     def construct_widgets(self, sort_params, sort_action):
         param_box = self.param_box = CustomCBox()
@@ -448,10 +583,13 @@ class SortingFrame(Frame):
         b_sort = Button('Сортировать')
         b_sort.clicked.connect(sort_action)
 
+        progress = self.construct_progress()
+
         layout = LHBox(self)
         layout.addWidget(param_box)
         layout.addWidget(order_box)
         layout.addWidget(b_sort)
+        layout.addWidget(progress)
 
     def __init__(self, sort_params: dict, sort_action):
         super().__init__()
@@ -460,19 +598,37 @@ class SortingFrame(Frame):
 
 
 class SearchFrame(Frame):
+    """Search line that searches as the user types."""
+
+    # Pause in typing after which the search starts
+    DEBOUNCE_MS = 250
+
     def get_query(self):
         query = (self.f_line.text(), self.f_cbox.currentData())
 
         return query
 
-    def construct_widgets(self, placeholder_text: str, search_action):
+    def search_now(self):
+        self.timer.stop()
+        self.search_action()
+
+    def construct_timer(self):
+        timer = self.timer = qc.QTimer(self)
+        timer.setSingleShot(True)
+        timer.setInterval(self.DEBOUNCE_MS)
+        timer.timeout.connect(self.search_action)
+
+    def construct_widgets(self, placeholder_text: str):
         search_line = self.f_line = Line()
         search_line.setPlaceholderText(placeholder_text)
+        search_line.textChanged.connect(self.timer.start)
+        search_line.returnPressed.connect(self.search_now)
 
         search_cbox = self.f_cbox = GenderBox()
+        search_cbox.currentIndexChanged.connect(self.search_now)
 
         b_search = Button('Найти')
-        b_search.clicked.connect(search_action)
+        b_search.clicked.connect(self.search_now)
 
         layout = LHBox(self)
         layout.addWidget(search_line)
@@ -482,7 +638,44 @@ class SearchFrame(Frame):
     def __init__(self, placeholder_text: str, search_action):
         super().__init__()
 
-        self.construct_widgets(placeholder_text, search_action)
+        self.search_action = search_action
+
+        self.construct_timer()
+        self.construct_widgets(placeholder_text)
+
+
+class VacancyFrame(Frame):
+    """Filter of rooms that have free beds for the chosen gender."""
+
+    SPACE_PREFIX = 'Свободно мест от: '
+
+    def get_query(self):
+        query = (self.f_cbox.currentData(), self.f_spin.value())
+
+        return query
+
+    def construct_widgets(self, filter_action, reset_action):
+        filter_cbox = self.f_cbox = GenderBox()
+
+        filter_spin = self.f_spin = SpaceSpin()
+        filter_spin.setPrefix(self.SPACE_PREFIX)
+
+        b_filter = Button('Подобрать')
+        b_filter.clicked.connect(filter_action)
+
+        b_reset = Button('Все комнаты')
+        b_reset.clicked.connect(reset_action)
+
+        layout = LHBox(self)
+        layout.addWidget(filter_cbox)
+        layout.addWidget(filter_spin)
+        layout.addWidget(b_filter)
+        layout.addWidget(b_reset)
+
+    def __init__(self, filter_action, reset_action):
+        super().__init__()
+
+        self.construct_widgets(filter_action, reset_action)
 
 
 # ------------------------------------------------------------------
@@ -517,6 +710,9 @@ class Window_Password(CenteredWindow):
 
     TITLE = 'Введите пароль'
 
+    # The main window is built once the password is accepted
+    authorized = qc.Signal()
+
     def check_password(self):
         password = self.password.text()
         pass_hash = hashlib.sha256(password.encode('UTF-8')).hexdigest()
@@ -535,7 +731,7 @@ class Window_Password(CenteredWindow):
             self.password.setText('')
             return
 
-        self.parent().show()
+        self.authorized.emit()
 
         self.hide()
 
@@ -573,7 +769,7 @@ class Window_Password(CenteredWindow):
 
         super().closeEvent(event)
 
-    def __init__(self, parent):
+    def __init__(self, parent=None):
         super().__init__(parent=parent)
 
         self.construct_window()
@@ -859,8 +1055,27 @@ class Dialog_OccupantSelect(Dialog):
 
     PLACEHOLDER_TEXT = 'Введите ФИО человека (Полное или часть). . .'
 
+    MOVING_TEXT = 'Показать жильцов других комнат'
+
     # ------------------------------------------------------------------
 
+    def get_candidate_where(self) -> dict:
+        """
+        Persons that may be put in the room: of a gender the room takes,
+        with no room or, if moving is allowed, from another room
+        """
+        where = {}
+
+        if self.room.kind != 's':
+            where['gender'] = self.room.kind
+
+        if self.moving.isChecked():
+            where['room'] = NotIn([self.room.key])
+        else:
+            where['room'] = 0
+
+        return where
+
     def accept(self):
         person = self.view.get_selected_item()
 
@@ -882,13 +1097,10 @@ class Dialog_OccupantSelect(Dialog):
     def set_buttons_active(self, active: bool):
         self.b_accept.setEnabled(active)
 
-    def rbutton_clicked(self, button: RButton):
-        key = button.key
-
+    def item_clicked(self, key: str):
         if key == self.view.selected_key:
             self.view.deselect_item()
             self.set_buttons_active(False)
-            self.view.update_view()
             return
 
         self.view.select_item(key)
@@ -896,23 +1108,31 @@ class Dialog_OccupantSelect(Dialog):
 
     # ------------------------------------------------------------------
 
+    def show_candidates(self, where: dict):
+        """Query the candidates again, the paged model reads the first
+        page and the rest as the view scrolls."""
+        person = self.view.get_selected_item()
+        if person is None or not match_where(where, person):
+            self.view.deselect_item()
+            self.set_buttons_active(False)
+
+        self.view.set_order_by(self.sort.get_order_by())
+        self.view.set_filter(where)
+
     def sort_items(self):
-        self.view.set_sorting_rule(self.sort.get_sorting_rule())
-        self.view.update_view()
+        self.show_candidates(self.view.model().where)
 
     def search_items(self):
-        query = self.search.get_query()
+        name, gender = self.search.get_query()
 
-        data = {
-            key: value
-            for key, value in self.data.items()
-            if query[0] in value.name and query[1] in value.gender
-        }
+        where = self.get_candidate_where()
+        if name:
+            where['name'] = Contains(name)
+        if gender and where.setdefault('gender', gender) != gender:
+            # The room does not take persons of this gender
+            where['gender'] = In([])
 
-        self.view.set_data(data)
-        self.view.deselect_item()
-        self.set_buttons_active(False)
-        self.view.update_view()
+        self.show_candidates(where)
 
     # ------------------------------------------------------------------
 
@@ -926,11 +1146,19 @@ class Dialog_OccupantSelect(Dialog):
 
         return self.search
 
+    def construct_moving(self):
+        moving = self.moving = CheckBox(self.MOVING_TEXT)
+        moving.toggled.connect(self.search_items)
+
+        return moving
+
     def construct_view(self):
-        self.view = PersonView(self)
-        self.view.set_data(self.data)
+        where = self.get_candidate_where()
+
+        # Only the candidates are read, a page at a time
+        self.view = PersonPageTableView(self, where)
 
-        self.view.rbutton_group.buttonClicked.connect(self.rbutton_clicked)
+        self.view.item_clicked.connect(self.item_clicked)
 
         return self.view.scroll_area
 
@@ -962,6 +1190,7 @@ class Dialog_OccupantSelect(Dialog):
     def construct_window(self):
         sort = self.construct_sort()
         search = self.construct_search()
+        moving = self.construct_moving()
 
         view = self.construct_view()
         buttons = self.construct_buttons()
@@ -970,6 +1199,7 @@ class Dialog_OccupantSelect(Dialog):
 
         l_central.addWidget(sort)
         l_central.addWidget(search)
+        l_central.addWidget(moving)
         l_central.addWidget(view)
         l_central.addWidget(buttons)
 
@@ -977,7 +1207,6 @@ class Dialog_OccupantSelect(Dialog):
         super().__init__(parent=parent)
 
         self.room = room
-        self.data = DataBase().get_elements('persons')
 
         self.construct_window()
 
@@ -1131,7 +1360,6 @@ class Window_View(CenteredWindow):
 
         params = dialog_edit.get_data()
         DataBase().create_data(self.DB_ELEMENT, params)
-        self.view.update_view()
 
     def edit_item(self):
         key = self.view.selected_key
@@ -1147,8 +1375,6 @@ class Window_View(CenteredWindow):
 
         DataBase().update_data(self.DB_ELEMENT, key, params)
 
-        self.view.update_view()
-
     def delete_item(self):
         key = self.view.selected_key
 
@@ -1163,13 +1389,17 @@ class Window_View(CenteredWindow):
         self.view.deselect_item()
         self.set_buttons_active(False)
 
-        self.view.update_view()
-
     # ------------------------------------------------------------------
 
     def sort_items(self):
-        self.view.set_sorting_rule(self.sort.get_sorting_rule())
-        self.view.update_view()
+        self.querier.start(order_by=self.sort.get_order_by())
+
+    def show_found(self, where, order_by, keys, rows):
+        if self.view.selected_key not in rows:
+            self.view.deselect_item()
+            self.set_buttons_active(False)
+
+        self.view.show_result(where, order_by, keys, rows)
 
     # ------------------------------------------------------------------
 
@@ -1182,18 +1412,14 @@ class Window_View(CenteredWindow):
         for action in self.menu.toggle_actions:
             action.setEnabled(active)
 
-    def rbutton_clicked(self, button: RButton):
-        key = button.key
-
+    def item_clicked(self, key: str):
         if key == self.view.selected_key:
             self.view.deselect_item()
             self.set_buttons_active(False)
-            self.view.update_view()
             return
 
         self.view.select_item(key)
         self.set_buttons_active(True)
-        self.view.update_view()
 
     # ------------------------------------------------------------------
 
@@ -1228,9 +1454,13 @@ class Window_View(CenteredWindow):
 
     def construct_view(self):
         self.view = self.VIEW_WIDGET(self)
-        self.view.set_data(self.data)
 
-        self.view.rbutton_group.buttonClicked.connect(self.rbutton_clicked)
+        self.view.item_clicked.connect(self.item_clicked)
+
+        # Filtered and sorted contents are read off the UI thread
+        self.querier = BackgroundQuery(self.DB_ELEMENT, self)
+        self.querier.finished.connect(self.show_found)
+        self.querier.busy.connect(self.sort.set_busy)
 
         return self.view.scroll_area
 
@@ -1282,7 +1512,7 @@ class Window_Rooms(Window_View):
     DB_ELEMENT = 'rooms'
 
     DIALOG = RoomEditDialog
-    VIEW_WIDGET = RoomView
+    VIEW_WIDGET = RoomCardView
     ELEMENT = Room
 
     WINDOW_WIDTH = 1036
@@ -1301,10 +1531,94 @@ class Window_Rooms(Window_View):
 
     APPLICATION_INFO = {'dev': DEVELOPER, 'version': VERSION, 'name': NAME}
 
+    STATUS_SCHEME = (
+        'Мест: {capacity}, занято: {occupied} | '
+        'Свободно: муж. {free[m]}, жен. {free[f]}, общ. {free[s]} | '
+        'Полных комнат: {full_rooms} | '
+        'Без комнаты: муж. {unhoused[m]}, жен. {unhoused[f]}'
+    )
+
     def open_window_occupants(self):
         window = Window_Persons(self)
         window.show()
 
+    def open_room_occupants(self, key: str):
+        room = DataBase().get_room(key)
+
+        window = Window_RoomOccupantsView(self, room)
+        window.show()
+
+    def allocate_persons(self):
+        plan = plan_allocation()
+
+        if not plan.assignments:
+            WarningMessageDialog('Нет жильцов, которых можно заселить!').exec()
+            return
+
+        db = DataBase()
+        room_counts = sorted(
+            (db.get_room(key).number, count)
+            for key, count in plan.get_room_counts().items()
+        )
+
+        dialog = AllocationConfirmDialog(
+            self, len(plan), len(plan.unplaced), room_counts
+        )
+        dialog.exec()
+
+        if not dialog.result() == 0:
+            return
+
+        plan.commit()
+
+    def filter_items(self):
+        gender, min_space = self.vacancy.get_query()
+
+        # Live conditions: rooms enter and leave the list as they fill up
+        # and free up
+        where = {'space': Range(min_space, None)}
+        if gender:
+            where['kind'] = In((gender, 's'))
+
+        self.querier.start(where)
+
+    def reset_filter(self):
+        self.querier.start({})
+
+    def construct_vacancy(self):
+        self.vacancy = VacancyFrame(self.filter_items, self.reset_filter)
+
+        return self.vacancy
+
+    def update_status(self, events: list = None):
+        """Show the occupancy counters (no database scan)."""
+        occupancy = DataBase().get_occupancy()
+        self.status.setText(self.STATUS_SCHEME.format(**occupancy))
+
+    def construct_status(self):
+        self.status = Label()
+        self.statusBar().addWidget(self.status)
+
+        DataBase().subscribe(self.update_status)
+
+        # The counters are built after the window is shown
+        qc.QTimer.singleShot(0, self.update_status)
+
+    def construct_view(self):
+        view = super().construct_view()
+
+        self.view.occupants_clicked.connect(self.open_room_occupants)
+
+        return view
+
+    def construct_window(self):
+        super().construct_window()
+
+        vacancy = self.construct_vacancy()
+        self.l_central.insertWidget(2, vacancy)
+
+        self.construct_status()
+
     def show_about(self):
         dialog = Dialog_About(self, self.APPLICATION_INFO)
         dialog.exec()
@@ -1339,6 +1653,7 @@ class Window_Rooms(Window_View):
         menu.add_action(
             m_room, 'Удалить', self.delete_item, True, shortcut='Del'
         )
+        menu.add_action(m_room, 'Автозаселение', self.allocate_persons)
 
         m_help = menu.add_menu('Справка')
         menu.add_action(
@@ -1352,7 +1667,9 @@ class Window_Rooms(Window_View):
         self.close()
 
     def closeEvent(self, event):
-        DataBase().save_data()
+        db = DataBase()
+        db.unsubscribe(self.update_status)
+        db.save_data()
         super().closeEvent(event)
 
 
@@ -1360,7 +1677,7 @@ class Window_Persons(Window_View):
     DB_ELEMENT = 'persons'
 
     DIALOG = PersonEditDialog
-    VIEW_WIDGET = PersonView
+    VIEW_WIDGET = PersonTableView
     ELEMENT = Person
 
     WINDOW_WIDTH = 695
@@ -1375,18 +1692,15 @@ class Window_Persons(Window_View):
     PLACEHOLDER_TEXT = 'Введите ФИО человека (Полное или часть). . .'
 
     def search_items(self):
-        query = self.search.get_query()
+        name, gender = self.search.get_query()
 
-        data = {
-            key: value
-            for key, value in self.data.items()
-            if query[0] in value.name and query[1] in value.gender
-        }
+        where = {}
+        if name:
+            where['name'] = Contains(name)
+        if gender:
+            where['gender'] = gender
 
-        self.view.set_data(data)
-        self.view.deselect_item()
-        self.set_buttons_active(False)
-        self.view.update_view()
+        self.querier.start(where)
 
     def construct_search(self):
         self.search = SearchFrame(self.PLACEHOLDER_TEXT, self.search_items)
@@ -1448,12 +1762,8 @@ class Window_RoomOccupantsView(CenteredWindow):
             return
 
         occupant = dialog.get_selected_person()
-        key = occupant.key
 
-        self.room.add_occupant(key)
-        self.occupant_data[key] = occupant
-
-        self.view.update_view()
+        self.room.add_occupant(occupant.key)
 
     def remove_person(self):
         selected_occupant = self.view.get_selected_item()
@@ -1469,13 +1779,10 @@ class Window_RoomOccupantsView(CenteredWindow):
         key = self.view.selected_key
 
         self.room.remove_occupant(key)
-        self.occupant_data.pop(key)
 
         self.view.deselect_item()
         self.set_buttons_active(False)
 
-        self.view.update_view()
-
     def show_help(self):
         dialog = Dialog_Help(self, 'room-occupants')
         dialog.exec()
@@ -1487,21 +1794,14 @@ class Window_RoomOccupantsView(CenteredWindow):
 
     # ------------------------------------------------------------------
 
-    def closeEvent(self, event):
-        self.parent().update_view()
-        super().closeEvent(event)
-
     def set_buttons_active(self, active: bool):
         for button in self.controls.toggle_buttons + self.menu.toggle_actions:
             button.setEnabled(active)
 
-    def rbutton_clicked(self, button: RButton):
-        key = button.key
-
+    def item_clicked(self, key: str):
         if key == self.view.selected_key:
             self.view.deselect_item()
             self.set_buttons_active(False)
-            self.view.update_view()
             return
 
         self.view.select_item(key)
@@ -1539,10 +1839,9 @@ class Window_RoomOccupantsView(CenteredWindow):
         return self.controls
 
     def construct_view(self):
-        self.view = PersonView(self)
-        self.view.set_data(self.occupant_data)
+        self.view = PersonView(self, {'room': self.room.key})
 
-        self.view.rbutton_group.buttonClicked.connect(self.rbutton_clicked)
+        self.view.item_clicked.connect(self.item_clicked)
 
         return self.view.scroll_area
 
@@ -1564,9 +1863,6 @@ class Window_RoomOccupantsView(CenteredWindow):
         super().__init__(parent=parent)
 
         self.room = room
-        self.occupant_data = {
-            number: DataBase().get_person(number) for number in room.occupants
-        }
 
         self.construct_window()
 
@@ -0,0 +1,145 @@
+from array import array
+from collections import Counter
+from typing import Iterable
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+GENDERS = ('m', 'f')
+
+KINDS = ('m', 'f', 's')
+
+GENDER_CODES = {gender: code for code, gender in enumerate(GENDERS)}
+
+KIND_CODES = {kind: code for code, kind in enumerate(KINDS)}
+
+# Room column value of a person with no room
+NO_ROOM = -1
+
+
+class ColumnStore:
+    """Columnar mirror of a database part: one int64 column per field.
+
+    Has the index interface (build/add/remove), so the database keeps it
+    in sync with the objects at commit. Rows are kept dense: the last row
+    is moved into the place of a removed one.
+    """
+
+    FIELDS = ()
+
+    def __init__(self) -> None:
+        self.columns = {name: array('q') for name in self.FIELDS}
+        # key -> row and row -> key
+        self.rows = {}
+        self.keys = []
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    def build(self, items: Iterable[tuple]) -> None:
+        """Fill the store with (key, row values) pairs."""
+        for key, value in items:
+            self.add(key, value)
+
+    def add(self, key: str, value: tuple) -> None:
+        self.rows[key] = len(self.keys)
+        self.keys.append(key)
+
+        for column, item in zip(self.columns.values(), value):
+            column.append(item)
+
+    def remove(self, key: str, value: tuple) -> None:
+        row = self.rows.pop(key, None)
+        if row is None:
+            return
+
+        last_key = self.keys.pop()
+        for column in self.columns.values():
+            last = column.pop()
+            if row < len(column):
+                column[row] = last
+
+        if last_key != key:
+            self.rows[last_key] = row
+            self.keys[row] = last_key
+
+    def get_column(self, name: str):
+        """Copy of the column: a NumPy array if NumPy is installed."""
+        column = self.columns[name]
+
+        if numpy is None:
+            return array('q', column)
+
+        # Copied, a live view would stop the array from growing
+        return numpy.frombuffer(column, dtype=numpy.int64).copy()
+
+    def count_by(self, name: str) -> dict:
+        """Number of rows for every value of a non-negative column."""
+        column = self.columns[name]
+
+        if numpy is None:
+            return dict(Counter(column))
+
+        counts = numpy.bincount(numpy.frombuffer(column, dtype=numpy.int64))
+        values = numpy.flatnonzero(counts)
+
+        return dict(zip(values.tolist(), counts[values].tolist()))
+
+    def sum_by(self, group: str, name: str) -> dict:
+        """Sum of the column for every value of a non-negative column."""
+        groups = self.columns[group]
+        column = self.columns[name]
+
+        if numpy is None:
+            sums = {}
+            for value, item in zip(groups, column):
+                sums[value] = sums.get(value, 0) + item
+            return sums
+
+        groups = numpy.frombuffer(groups, dtype=numpy.int64)
+        column = numpy.frombuffer(column, dtype=numpy.int64)
+
+        sums = numpy.bincount(groups, weights=column).astype(numpy.int64)
+        values = numpy.flatnonzero(numpy.bincount(groups))
+
+        return dict(zip(values.tolist(), sums[values].tolist()))
+
+
+class RoomColumns(ColumnStore):
+    FIELDS = ('key', 'number', 'kind', 'capacity', 'space')
+
+    @staticmethod
+    def get_row(state: dict) -> tuple:
+        return (
+            int(state['key']),
+            state['number'],
+            KIND_CODES[state['kind']],
+            state['capacity'],
+            state['capacity'] - len(state['occupants']),
+        )
+
+
+class PersonColumns(ColumnStore):
+    FIELDS = ('age', 'gender', 'room')
+
+    @staticmethod
+    def get_row(state: dict) -> tuple:
+        room = state['room']
+
+        return (
+            state['age'],
+            GENDER_CODES[state['gender']],
+            int(room) if room else NO_ROOM,
+        )
+
+
+__all__ = [
+    'ColumnStore',
+    'GENDERS',
+    'KINDS',
+    'NO_ROOM',
+    'PersonColumns',
+    'RoomColumns',
+]
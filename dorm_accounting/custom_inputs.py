@@ -62,6 +62,11 @@ class NumberSpin(CustomSpin):
     MINIMUM = 1
 
 
+class SpaceSpin(CustomSpin):
+
+    MINIMUM = 1
+
+
 class PhoneLine(Line):
 
     MASK = "(999)-999-99-99"
@@ -79,5 +84,6 @@ __all__ = [
     "CustomSpin",
     "AgeSpin",
     "NumberSpin",
+    "SpaceSpin",
     "PhoneLine"
 ]
\ No newline at end of file
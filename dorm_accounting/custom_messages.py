@@ -115,6 +115,43 @@ class PersonRemoveConfirmDialog(MBox):
         self.setWindowTitle(self.WINDOW_TITLE)
 
 
+class AllocationConfirmDialog(MBox):
+    """
+    Возвращает 0 - Да, 1 - Нет
+    """
+
+    MESSAGE = "Будет заселено жильцов: {} (в комнат: {}). Продолжить?"
+    INFO_MESSAGE = "Не хватит мест для жильцов: {}"
+
+    ROOM_LINE = "Комната {}: {}"
+
+    WINDOW_TITLE = "Автозаселение"
+
+    def __init__(
+        self, parent, persons: int, unplaced: int, room_counts: list
+    ):
+        super().__init__(parent=parent)
+
+        self.setIcon(self.Question)
+
+        self.setText(self.MESSAGE.format(persons, len(room_counts)))
+        if unplaced:
+            self.setInformativeText(self.INFO_MESSAGE.format(unplaced))
+
+        self.setDetailedText("\n".join(
+            self.ROOM_LINE.format(number, count)
+            for number, count in room_counts
+        ))
+
+        self.addButton("Да", self.YesRole)
+        b_no = self.addButton("Нет", self.NoRole)
+
+        self.setDefaultButton(b_no)
+        self.setEscapeButton(b_no)
+
+        self.setWindowTitle(self.WINDOW_TITLE)
+
+
 class InvalidOccupantDialog(MBox):
 
     MESSAGE = "Данный человек не может быть заселён в эту комнату: \"{}\"!"
@@ -302,6 +339,7 @@ __all__ = [
     "RoomChangeConfirmDialog",
     "PersonChangeConfirmDialog",
     "PersonRemoveConfirmDialog",
+    "AllocationConfirmDialog",
     "InvalidOccupantDialog",
     "NoRoomDialog",
     "OccupantInRoomDialog",
@@ -1,6 +1,22 @@
-import os
-import pickle
 import hashlib
+import functools
+import threading
+from operator import itemgetter
+from contextlib import contextmanager
+
+from .columns import PersonColumns, RoomColumns
+from .events import make_events
+from .indexes import (
+    HashIndex,
+    PersonCounters,
+    RoomCounters,
+    SortedIndex,
+    TrigramIndex,
+    VacancyIndex
+)
+from .keys import KeyAllocator
+from .query import Query
+from .storage import PickleStorage, SQLiteStorage
 
 class SingletonMeta(type):
     """
@@ -13,13 +29,34 @@ class SingletonMeta(type):
         return cls.instance
 
 
+def transactional(method):
+    """
+    Decorator that runs the method in a database transaction
+
+    Nested transactions are merged into the outermost one, which is written
+    to the journal as a single record
+    """
+
+    @functools.wraps(method)
+    def wrapper(*args, **kwargs):
+        with DataBase().transaction():
+            return method(*args, **kwargs)
+
+    return wrapper
+
+
 class DataBaseObject:
     """
     Base class for database objects
+
+    Objects are slotted (no per-instance __dict__) to keep large databases
+    compact in memory
     """
 
-    properties_to_jsonify = ["key"] 
-    
+    __slots__ = ("key",)
+
+    properties_to_jsonify = ("key",)
+
     def jsonify(self) -> dict:
         """
         Jsonifies the database object
@@ -28,6 +65,40 @@ class DataBaseObject:
         properties_json = {key: getattr(self, key) for key in self.properties_to_jsonify}
         return properties_json
 
+    def snapshot(self) -> dict:
+        """
+        Returns a detached copy of the object state (used by the journal)
+        """
+        state = self.jsonify()
+        for key, value in state.items():
+            if isinstance(value, list):
+                state[key] = value.copy()
+        return state
+
+    def restore(self, state: dict) -> None:
+        """
+        Restores the object state taken by snapshot (used by rollback)
+
+        @state - object state
+        """
+        for key, value in state.items():
+            if isinstance(value, list):
+                value = value.copy()
+            setattr(self, key, value)
+
+    def __getstate__(self) -> dict:
+        return self.jsonify()
+
+    def __setstate__(self, state) -> None:
+        # Objects pickled before __slots__ were added keep their state in
+        # __dict__ along with a per-instance properties_to_jsonify list
+        if isinstance(state, tuple):
+            state = {**(state[0] or {}), **state[1]}
+
+        for key, value in state.items():
+            if key in self.properties_to_jsonify:
+                setattr(self, key, value)
+
     def __eq__(self, o) -> bool:
 
         if type(self) != type(o):
@@ -50,15 +121,22 @@ class DataBaseObject:
 
 class Room(DataBaseObject):
 
+    __slots__ = ("number", "kind", "capacity", "occupants", "space")
+
+    properties_to_jsonify = ("key", "number", "kind", "capacity", "occupants")
+
     #------------------------------------------------------------------
 
+    @transactional
     def add_occupant(self, key:str) -> None:
         """
         Adds occupant to the room
 
         @key - occupant's key in db
         """
-        
+
+        DataBase().mark_dirty("rooms", self.key)
+
         self.occupants.append(key)
         person = DataBase().get_person(key)
 
@@ -66,6 +144,7 @@ class Room(DataBaseObject):
 
         self.space -= 1
     
+    @transactional
     def remove_occupant(self, key:str) -> None:
         """
         Removes occupant from the room
@@ -73,6 +152,8 @@ class Room(DataBaseObject):
         @key - occupant's key in db
         """
 
+        DataBase().mark_dirty("rooms", self.key)
+
         self.occupants.remove(key)
         
         person = DataBase().get_person(key)
@@ -82,6 +163,7 @@ class Room(DataBaseObject):
 
     #------------------------------------------------------------------
 
+    @transactional
     def edit(self, params:dict) -> None:
         """
         Edit room's parameters
@@ -89,10 +171,13 @@ class Room(DataBaseObject):
         @params - new parameters
         """
 
+        DataBase().mark_dirty("rooms", self.key)
+
         self.number = params["number"]
         self.change_kind(params["kind"])
         self.change_capacity(params["capacity"])
 
+    @transactional
     def change_kind(self, kind:str) -> None:
         """
         Safe change room kind
@@ -103,14 +188,17 @@ class Room(DataBaseObject):
         if kind == self.kind:
             return
 
+        DataBase().mark_dirty("rooms", self.key)
+
         if kind != "s":
-            for occupant in self.occupants:
+            for occupant in self.occupants.copy():
                 person = DataBase().get_person(occupant)
                 if person.gender != kind:
                     self.remove_occupant(occupant)
 
         self.kind = kind
 
+    @transactional
     def change_capacity(self, capacity:int) -> None:
         """
         Safe change room capacity
@@ -118,6 +206,8 @@ class Room(DataBaseObject):
         @capacity - room capacity
         """
 
+        DataBase().mark_dirty("rooms", self.key)
+
         self.space = capacity - len(self.occupants)
 
         while self.space < 0:
@@ -128,14 +218,28 @@ class Room(DataBaseObject):
 
     #------------------------------------------------------------------
 
+    @transactional
     def clear_connections(self) -> None:
         """
         Clears room connections for safe deletion
         """
 
-        for occupant in self.occupants:
+        for occupant in self.occupants.copy():
             self.remove_occupant(occupant)
 
+    def restore(self, state: dict) -> None:
+        """
+        Restores the room state taken by snapshot (used by rollback)
+
+        @state - room state
+        """
+        super().restore(state)
+        self.space = self.capacity - len(self.occupants)
+
+    def __setstate__(self, state) -> None:
+        super().__setstate__(state)
+        self.space = self.capacity - len(self.occupants)
+
     #------------------------------------------------------------------
     
     def __init__(self, key:str, number:int, kind:str, capacity:int, occupants:list=[]) -> None:
@@ -151,8 +255,6 @@ class Room(DataBaseObject):
 
         super().__init__(key)
 
-        self.properties_to_jsonify = ["key", "number", "kind", "capacity", "occupants"]
-
         self.number = number
         self.kind = kind
         self.capacity = capacity
@@ -164,8 +266,15 @@ class Room(DataBaseObject):
 
 class Person(DataBaseObject):
 
+    __slots__ = ("room", "name", "gender", "age", "phone", "passport")
+
+    properties_to_jsonify = (
+        "key", "room", "name", "gender", "age", "phone", "passport"
+    )
+
     #------------------------------------------------------------------
 
+    @transactional
     def edit(self, params):
         """
         Edit occupant's parameters
@@ -173,12 +282,15 @@ class Person(DataBaseObject):
         @params - new parameters
         """
 
+        DataBase().mark_dirty("persons", self.key)
+
         self.change_gender(params["gender"])
         self.age = params["age"]
         self.name = params["name"]
         self.phone = params["phone"]
         self.passport = params["passport"]
         
+    @transactional
     def change_gender(self, gender):
         """
         Safe change occupant's gender
@@ -189,6 +301,8 @@ class Person(DataBaseObject):
         if self.gender == gender:
             return
 
+        DataBase().mark_dirty("persons", self.key)
+
         if self.room:            
             room = DataBase().get_room(self.room)
             if room.kind != "s":
@@ -198,27 +312,34 @@ class Person(DataBaseObject):
 
     #------------------------------------------------------------------
 
+    @transactional
     def change_room(self, key):
         """
         Change the occupant's room
 
         @key - room database key
         """
-        
+
+        DataBase().mark_dirty("persons", self.key)
+
         old_room = DataBase().get_room(self.room)
         if old_room:
             old_room.remove_occupant(self.key)
         self.room = key
     
+    @transactional
     def reset_room(self):
         """
         Reset occupant's room to 0 (int)
         """
 
+        DataBase().mark_dirty("persons", self.key)
+
         self.room = 0
 
     #------------------------------------------------------------------
 
+    @transactional
     def clear_connections(self):
         """
         Clears occupant connections for safe deletion
@@ -245,8 +366,6 @@ class Person(DataBaseObject):
         @room - occupant's room (Default 0)
         """
 
-        self.properties_to_jsonify = ["key", "room", "name", "gender", "age", "phone", "passport"]
-
         self.room = room
         self.name = name
         self.gender = gender
@@ -263,13 +382,67 @@ class DataBase(metaclass=SingletonMeta):
 
     RESERVE = "./program_data_copy.dat"
 
+    JOURNAL = "./program_data.journal"
+
+    # Journal records after which the journal is compacted into a snapshot
+    CHECKPOINT_INTERVAL = 1000
+
+    SQLITE_FILENAME = "./program_data.sqlite3"
+
+    # Storage backend: "pickle" (snapshot + journal) or "sqlite"
+    STORAGE = "pickle"
+
     ELEMENTS = {
         "rooms": Room,
         "persons": Person
     }
 
+    # Secondary indexes: part -> index name ->
+    # (value of an object state, index type)
+    # Sorted indexes named after a field also give the objects
+    # in the order of the field
+    INDEXES = {
+        "rooms": {
+            "key": (lambda state: int(state["key"]), SortedIndex),
+            "number": (itemgetter("number"), SortedIndex),
+            "kind": (itemgetter("kind"), SortedIndex),
+            "space": (
+                lambda state: state["capacity"] - len(state["occupants"]),
+                SortedIndex
+            ),
+            "vacancy": (
+                lambda state: (
+                    state["kind"], state["capacity"] - len(state["occupants"])
+                ),
+                VacancyIndex
+            ),
+            "columns": (RoomColumns.get_row, RoomColumns),
+            "counters": (
+                lambda state: (
+                    state["kind"], state["capacity"], len(state["occupants"])
+                ),
+                RoomCounters
+            )
+        },
+        "persons": {
+            "key": (lambda state: int(state["key"]), SortedIndex),
+            "name": (itemgetter("name"), SortedIndex),
+            "name_text": (itemgetter("name"), TrigramIndex),
+            "gender": (itemgetter("gender"), SortedIndex),
+            "room": (itemgetter("room"), HashIndex),
+            "phone": (itemgetter("phone"), SortedIndex),
+            "passport": (itemgetter("passport"), HashIndex),
+            "columns": (PersonColumns.get_row, PersonColumns),
+            "counters": (
+                lambda state: (state["gender"], bool(state["room"])),
+                PersonCounters
+            )
+        }
+    }
+
     #------------------------------------------------------------------
 
+    @transactional
     def create_data(self, part:str, params:dict) -> None:
         """
         Create database object
@@ -280,10 +453,15 @@ class DataBase(metaclass=SingletonMeta):
 
         Element = self.ELEMENTS.get(part)
         new_key = self.get_next_available_key(part)
+
+        # Marked before the object is made: if the parameters are refused,
+        # the rollback frees the key
+        self.mark_dirty(part, new_key)
         new_element = Element(new_key, **params)
 
         self.push_data(part, new_key, new_element)
 
+    @transactional
     def update_data(self, part:str, key:str, params:dict) -> None:
         """
         Edits the database object
@@ -296,6 +474,7 @@ class DataBase(metaclass=SingletonMeta):
         element = self.db.get(part)[key]
         element.edit(params)
 
+    @transactional
     def delete_data(self, part:str, key:str) -> None:
         """
         Deletes database object
@@ -307,14 +486,44 @@ class DataBase(metaclass=SingletonMeta):
         db_part = self.db.get(part)
 
         element = db_part.get(key)
+
+        self.mark_dirty(part, key)
         element.clear_connections()
 
         db_part.pop(key)
 
-        keys = self.keys[part]
+        self.keys[part].release(int(key))
+
+    @transactional
+    def insert_elements(self, part: str, params_list: list) -> list:
+        """
+        Creates database objects in bulk
+
+        Keys are allocated at once. Use drop_indexes/build_indexes around
+        big inserts to rebuild the indexes once instead of updating them
+        for every object
+
+        @part - database part
+        @params_list - parameters of the objects
+
+        Returns the keys of the new objects
+        """
+        Element = self.ELEMENTS.get(part)
+        db_part = self.db.get(part)
+
+        keys = self.keys[part].allocate_many(len(params_list))
+        keys = [str(key) for key in keys]
 
-        keys.append(int(key))
-        keys.sort()
+        # Marked before the objects are made, so the rollback frees all the
+        # keys if some parameters are refused; a key freed by the
+        # transaction keeps the state it started from
+        for key in keys:
+            self.dirty.setdefault((part, key), (None, None))
+
+        for key, params in zip(keys, params_list):
+            db_part[key] = Element(key, **params)
+
+        return keys
 
     #------------------------------------------------------------------
 
@@ -331,32 +540,171 @@ class DataBase(metaclass=SingletonMeta):
 
         self.db.get(part)[key] = value
 
+    # ------------------------------------------------------------------
+
+    @contextmanager
+    def transaction(self):
+        """
+        Runs the changes made inside as one transaction
+
+        The changes are written as a single journal record and the indexes
+        are updated once, at commit. If an exception leaves the outermost
+        transaction, every change made in it is rolled back
+
+        with DataBase().transaction():
+            ...
+        """
+        self.transaction_depth += 1
+        try:
+            yield self
+        except BaseException:
+            self.transaction_depth -= 1
+            if not self.transaction_depth:
+                self.rollback()
+            raise
+
+        self.transaction_depth -= 1
+        if not self.transaction_depth:
+            self.commit_changes()
+
+    def mark_dirty(self, part: str, key: str) -> None:
+        """
+        Marks the database object as changed by the current transaction
+
+        Must be called before the object is changed: the first call
+        remembers the object state the transaction started from
+
+        @part - database part
+        @key - database key
+        """
+        if (part, key) in self.dirty:
+            return
+
+        element = self.db[part].get(key)
+        before = element.snapshot() if element else None
+        self.dirty[(part, key)] = (element, before)
+
+    def commit_changes(self) -> None:
+        """
+        Writes the objects changed by the transaction to the storage
+        and updates the indexes
+
+        ! Not used outside of database object
+        """
+        if not self.dirty:
+            return
+
+        record = []
+        changes = []
+
+        # Queries read the indexes on worker threads under the lock
+        with self.lock:
+            for (part, key), (_, before) in self.dirty.items():
+                element = self.db[part].get(key)
+                after = element.snapshot() if element else None
+
+                record.append((part, key, after))
+                changes.append((part, key, before, after))
+                self.update_indexes(part, key, before, after)
+
+            self.dirty = {}
+            self.storage.write(record)
+
+            self.version += 1
+
+        events = make_events(changes)
+        if not events:
+            return
+
+        for callback in self.subscribers.copy():
+            callback(events)
+
+    def rollback(self) -> None:
+        """
+        Brings the objects changed by the transaction back to the state
+        it started from
+
+        ! Not used outside of database object
+        """
+        for (part, key), (element, before) in self.dirty.items():
+            db_part = self.db[part]
+
+            if before is None:
+                db_part.pop(key, None)
+                self.keys[part].release(int(key))
+                continue
+
+            element.restore(before)
+            db_part[key] = element
+            self.keys[part].reserve(int(key))
+
+        self.dirty = {}
+
+    def subscribe(self, callback) -> None:
+        """
+        Calls the callback after every committed change with the list
+        of its change events (see events.ChangeEvent)
+
+        @callback - function taking the list of events
+        """
+        if callback not in self.subscribers:
+            self.subscribers.append(callback)
+
+    def unsubscribe(self, callback) -> None:
+        """
+        Stops calling the callback after changes
+
+        @callback - subscribed function
+        """
+        if callback in self.subscribers:
+            self.subscribers.remove(callback)
+
+    # ------------------------------------------------------------------
+
     def save_data(self) -> None:
         """
-        Saves the database into a file
+        Saves the database changes to disk
+
+        Changes are written as they are made, so this only flushes them
+        and costs time proportional to the edits, not to the database size
         """
 
-        with open(self.FILENAME, "wb") as f:
-            pickle.dump(self.db, f)
+        self.storage.save()
 
-        with open(self.RESERVE, "wb") as f:
-            pickle.dump(self.db, f)
+    def checkpoint(self) -> None:
+        """
+        Compacts the stored changes (e.g. the journal into a new snapshot)
+        """
+        self.storage.checkpoint()
 
-    def load_data(self) -> None:
+    def create_storage(self):
         """
-        Loads data from file
+        Creates the storage backend selected by STORAGE
+
+        ! Not used outside of database object
         """
+        pickle_storage = PickleStorage(
+            self.ELEMENTS,
+            self.FILENAME,
+            self.RESERVE,
+            self.JOURNAL,
+            self.CHECKPOINT_INTERVAL
+        )
+
+        if self.STORAGE == "sqlite":
+            return SQLiteStorage(
+                self.ELEMENTS, self.SQLITE_FILENAME, legacy=pickle_storage
+            )
 
-        if not os.path.exists(self.FILENAME):
-            with open (self.FILENAME, "wb") as nul_file:
-                pickle.dump({"rooms": {}, "persons": {}}, nul_file)
+        return pickle_storage
 
-        with open(self.FILENAME, "rb") as f:
-            database = pickle.load(f)
-            self.db = database
+    def load_data(self) -> None:
+        """
+        Loads data from the storage
+        """
 
-            if not self.db.get("password"):
-                self.db["password"] = "5e884898da28047151d0e56f8dc6292773603d0d6aabbdd62a11ef721d1542d8"
+        self.storage = self.create_storage()
+        self.db = self.storage.load()
 
         self.authorized = False
 
@@ -365,26 +713,9 @@ class DataBase(metaclass=SingletonMeta):
         Loads the unique database keys
         """
 
-        try:
-            keys_rooms = tuple(map(int, self.db["rooms"].keys()))
-            
-            max_key = max(keys_rooms)
-        except ValueError:
-            self.room_keys = [0]
-        else:
-            self.room_keys = [key for key in range(max_key+2) if key not in keys_rooms]
-
-        try:
-            keys_persons = tuple(map(int, self.db["persons"].keys()))
-            max_key = max(keys_persons)
-        except ValueError:
-            self.person_keys = [0]
-        else:
-            self.person_keys = [key for key in range(max_key+2) if key not in keys_persons]
-
         self.keys = {
-            "rooms": self.room_keys,
-            "persons": self.person_keys
+            part: KeyAllocator(map(int, self.db[part].keys()))
+            for part in self.ELEMENTS
         }
 
     def check_password(self, password:str) -> bool:
@@ -417,7 +748,7 @@ class DataBase(metaclass=SingletonMeta):
 
         new_hash = hashlib.sha256(password.encode("UTF-8")).hexdigest()
 
-        self.db["password"] = new_hash
+        self.storage.set_password(new_hash)
 
     #------------------------------------------------------------------
 
@@ -432,6 +763,17 @@ class DataBase(metaclass=SingletonMeta):
 
         return data
 
+    def iter_states(self, part: str):
+        """
+        Iterates (key, state) pairs of all the objects of the part
+
+        Unlike get_elements(part).items() the objects are not loaded into
+        memory, the states are streamed from the storage
+
+        @part - part name
+        """
+        return self.storage.iter_states(part)
+
     def get_room(self, key) -> Room:
         """
         Returns room with a given key
@@ -452,21 +794,287 @@ class DataBase(metaclass=SingletonMeta):
 
     #------------------------------------------------------------------
 
-    def get_next_available_key(self, part:str) -> str:
+    def get_index(self, part: str, name: str):
         """
-        Returns next available key for the needed object
+        Returns the secondary index, building it on first use
+
+        @part - part name
+        @name - index name (see INDEXES)
+        """
+        part_indexes = self.indexes.setdefault(part, {})
+
+        index = part_indexes.get(name)
+        if index is not None:
+            return index
+
+        with self.lock:
+            index = part_indexes.get(name)
+            if index is not None:
+                return index
+
+            get_value, Index = self.INDEXES[part][name]
+            index = Index()
+
+            # Counters are seeded from aggregates where the storage can
+            # count them, without loading every object
+            groups = self.storage.count_groups(part, name)
+            if groups is not None:
+                index.build_groups(groups)
+            else:
+                index.build(
+                    (key, get_value(state))
+                    for key, state in self.iter_committed_states(part)
+                )
+
+            # Registered once complete: commits update only built indexes
+            part_indexes[name] = index
+
+        return index
+
+    def iter_committed_states(self, part: str):
+        """
+        Iterates (key, state) pairs of the objects of the part as of the
+        last commit: objects changed by the transaction in progress give
+        the state they had before it, the way commits expect the indexes
+
+        @part - part name
+
+        ! not used outside of database
+        """
+        before_states = {
+            key: before
+            for (dirty_part, key), (_, before) in self.dirty.items()
+            if dirty_part == part
+        }
+
+        for key, element in self.db[part].items():
+            if key not in before_states:
+                yield key, element.jsonify()
+
+        for key, before in before_states.items():
+            if before is not None:
+                yield key, before
+
+    def drop_indexes(self, part: str) -> list:
+        """
+        Drops the built indexes of the part, returns their names
+
+        @part - part name
+        """
+        return list(self.indexes.pop(part, {}))
+
+    def build_indexes(self, part: str, names) -> None:
+        """
+        Builds the indexes of the part with the given names
 
         @part - part name
+        @names - index names (see INDEXES)
+        """
+        for name in names:
+            self.get_index(part, name)
+
+    def update_indexes(
+        self, part: str, key: str, before: dict, after: dict
+    ) -> None:
+        """
+        Brings the built indexes of the part in line with an object change
+
+        @part - part name
+        @key - database key
+        @before - object state before the change (None if created)
+        @after - object state after the change (None if deleted)
 
         ! not used outside of database
         """
-        keys = self.keys.get(part)
+        for name, index in self.indexes.get(part, {}).items():
+            get_value = self.INDEXES[part][name][0]
 
-        new_key = keys.pop(0)
-        if not keys:
-            keys.append(new_key+1)
+            old_value = get_value(before) if before else None
+            new_value = get_value(after) if after else None
 
-        return str(new_key)
+            if before and after and old_value == new_value:
+                continue
+
+            if before:
+                index.remove(key, old_value)
+            if after:
+                index.add(key, new_value)
+
+    def lookup(self, part: str, field: str, value) -> set:
+        """
+        Returns keys of the objects whose field equals the value
+
+        @part - part name
+        @field - indexed field name
+        @value - field value
+        """
+        return self.get_index(part, field).find(value)
+
+    def lookup_prefix(self, part: str, field: str, prefix: str) -> set:
+        """
+        Returns keys of the objects whose field starts with the prefix
+
+        @part - part name
+        @field - field with a sorted index
+        @prefix - value prefix
+        """
+        return self.get_index(part, field).find_prefix(prefix)
+
+    def search_text(self, part: str, name: str, text: str) -> set:
+        """
+        Returns keys of the objects whose field contains the text
+        (case-insensitive, "ё" matches "е")
+
+        @part - part name
+        @name - name of a trigram index
+        @text - text to search for
+        """
+        return self.get_index(part, name).find(text)
+
+    def find_vacant_rooms(
+        self, gender: str = None, min_space: int = 1
+    ) -> list:
+        """
+        Returns keys of the rooms that can take persons of the gender
+
+        Rooms are ordered by kind, then by free space
+
+        @gender - occupant gender ("m"/"f"), any room kind if not given
+        @min_space - least number of free beds (Default 1)
+        """
+        kinds = (gender, "s") if gender else ("m", "f", "s")
+
+        vacancy = self.get_index("rooms", "vacancy")
+
+        return list(vacancy.iter_vacant(kinds, min_space))
+
+    def get_columns(self, part: str):
+        """
+        Returns the columnar mirror of the part, building it on first use
+
+        @part - part name
+        """
+        return self.get_index(part, "columns")
+
+    def get_occupancy(self) -> dict:
+        """
+        Returns the occupancy summary:
+        capacity - total beds, occupied - occupied beds,
+        free - free beds by room kind, full_rooms - rooms with no free beds,
+        persons - number of persons, unhoused - persons with no room by gender
+
+        The counters are built once and then kept up to date at every
+        commit, so repeated calls cost O(1)
+        """
+        rooms = self.get_index("rooms", "counters")
+        persons = self.get_index("persons", "counters")
+
+        return {
+            "capacity": rooms.capacity,
+            "occupied": rooms.occupied,
+            "free": {
+                kind: rooms.free.get(kind, 0) for kind in ("m", "f", "s")
+            },
+            "full_rooms": rooms.full,
+            "persons": persons.total,
+            "unhoused": {
+                gender: persons.unhoused.get(gender, 0)
+                for gender in ("m", "f")
+            }
+        }
+
+    def query(
+        self,
+        part: str,
+        where: dict = None,
+        order_by: str = None,
+        limit: int = None,
+        offset: int = 0
+    ) -> Query:
+        """
+        Returns a lazy query, iterating it yields (key, object) pairs
+
+        The query uses an index where it is cheaper than a scan,
+        see Query.explain() for the chosen plan
+
+        @part - part name
+        @where - field -> value or condition (Contains, Prefix, Range, In)
+        @order_by - field to order by, "-field" for descending order
+        @limit - largest number of objects (Default all)
+        @offset - number of objects to skip (Default 0)
+        """
+        return Query(self, part, where, order_by, limit, offset)
+
+    def get_ordered_keys(self, part: str, order_by: str) -> list:
+        """
+        Returns keys of all the objects of the part in the order
+
+        The ascending permutation of a field is cached until the next
+        commit changes the version, a descending order is its reverse:
+        unchanged data is never sorted again
+
+        @part - part name
+        @order_by - field to order by, "-field" for descending order
+
+        Called on worker threads: the keys are read and cached under the
+        lock, so no commit comes in meanwhile
+
+        ! The returned list is shared, do not change it
+        """
+        field = order_by.lstrip("-")
+
+        with self.lock:
+            cached = self.sorted_keys.get((part, field))
+            if cached is None or cached[0] != self.version:
+                cached = (self.version, self.read_ordered_keys(part, field))
+                self.sorted_keys[(part, field)] = cached
+
+        keys = cached[1]
+
+        return keys[::-1] if order_by.startswith("-") else keys
+
+    def read_ordered_keys(self, part: str, field: str) -> list:
+        """
+        Returns keys of all the objects of the part in ascending order
+        of the field
+
+        A sorted index of the field gives the committed objects only, so
+        changes of a transaction in progress do not get into the result
+
+        @part - part name
+        @field - field to order by
+
+        ! not used outside of database
+        """
+        if field in self.INDEXES[part]:
+            index = self.get_index(part, field)
+            if isinstance(index, SortedIndex):
+                return list(index.iter_keys())
+
+        return [key for key, _ in self.query(part, order_by=field)]
+
+    def get_elements_by_keys(self, part: str, keys) -> dict:
+        """
+        Returns objects of the part with the given keys
+
+        @part - part name
+        @keys - database keys
+        """
+        db_part = self.db[part]
+
+        return {key: db_part[key] for key in keys}
+
+    # ------------------------------------------------------------------
+
+    def get_next_available_key(self, part:str) -> str:
+        """
+        Returns next available key for the needed object
+
+        @part - part name
+
+        ! not used outside of database
+        """
+        return str(self.keys[part].allocate())
 
     #------------------------------------------------------------------
 
@@ -475,6 +1083,20 @@ class DataBase(metaclass=SingletonMeta):
         Initializes the database
         """
 
+        self.transaction_depth = 0
+        self.dirty = {}
+        self.indexes = {}
+        self.subscribers = []
+
+        # Held by commits while they change the indexes and by queries
+        # reading them on worker threads (see workers.QueryTask)
+        self.lock = threading.RLock()
+
+        # Number of commits, tags the cached orders of get_ordered_keys
+        # and the results of background queries
+        self.version = 0
+        self.sorted_keys = {}
+
         self.load_data()
         self.load_keys()
 
@@ -0,0 +1,76 @@
+INSERTED = 'inserted'
+
+UPDATED = 'updated'
+
+DELETED = 'deleted'
+
+# Room occupants or person room changed (the objects are UPDATED as well)
+OCCUPANCY_CHANGED = 'occupancy-changed'
+
+
+class ChangeEvent:
+    """Committed change of some objects of a database part."""
+
+    def __init__(self, kind: str, part: str, keys: set) -> None:
+        self.kind = kind
+        self.part = part
+        self.keys = keys
+
+    def __repr__(self) -> str:
+        return f'ChangeEvent({self.kind}, {self.part}, {sorted(self.keys)})'
+
+
+def get_change_kinds(before: dict, after: dict) -> list:
+    """Event kinds of an object change given its states (None if absent)."""
+    if before is None:
+        return [INSERTED] if after is not None else []
+
+    if after is None:
+        return [DELETED]
+
+    if before == after:
+        return []
+
+    kinds = [UPDATED]
+
+    occupancy = 'occupants' if 'occupants' in after else 'room'
+    if before[occupancy] != after[occupancy]:
+        kinds.append(OCCUPANCY_CHANGED)
+
+    return kinds
+
+
+def make_events(changes) -> list:
+    """Events of (part, key, before, after) object changes, one per kind
+    and part."""
+    grouped = {}
+
+    for part, key, before, after in changes:
+        for kind in get_change_kinds(before, after):
+            grouped.setdefault((kind, part), set()).add(key)
+
+    return [
+        ChangeEvent(kind, part, keys) for (kind, part), keys in grouped.items()
+    ]
+
+
+def get_keys(events: list, part: str, *kinds: str) -> set:
+    """Keys of the part changed by events of the kinds (any if none)."""
+    keys = set()
+
+    for event in events:
+        if event.part == part and (not kinds or event.kind in kinds):
+            keys |= event.keys
+
+    return keys
+
+
+__all__ = [
+    'DELETED',
+    'INSERTED',
+    'OCCUPANCY_CHANGED',
+    'UPDATED',
+    'ChangeEvent',
+    'get_keys',
+    'make_events',
+]
@@ -0,0 +1,297 @@
+"""Streaming export of rooms and persons to CSV, JSON Lines or a columnar file.
+
+Usage: python -m dorm_accounting.exporter {rooms,persons} FILE [--sqlite]
+
+The format is chosen by the file extension: .csv, .jsonl or .col.
+
+Columnar file layout (little-endian, every block aligned to 8 bytes):
+    b'DORMCOL1', uint64 header length, JSON header, column blocks.
+The header holds the row count and, for every column, its name, type and
+blocks as [offset, size] pairs; offsets are counted from the first 8-byte
+boundary after the header. "int" columns are int64 arrays; "str" columns
+are an int64 array of rows + 1 offsets into a block of UTF-8 data.
+"""
+
+import argparse
+import csv
+import json
+import mmap
+import shutil
+import struct
+import tempfile
+from array import array
+from typing import Iterable, Iterator
+
+from .database import DataBase
+
+MAGIC = b'DORMCOL1'
+
+ALIGNMENT = 8
+
+# Values buffered per column before they are written out
+CHUNK_SIZE = 4096
+
+# part -> (column name, type)
+SCHEMES = {
+    'rooms': (
+        ('key', 'int'),
+        ('number', 'int'),
+        ('kind', 'str'),
+        ('capacity', 'int'),
+        ('space', 'int'),
+    ),
+    'persons': (
+        ('key', 'int'),
+        ('name', 'str'),
+        ('gender', 'str'),
+        ('age', 'int'),
+        ('phone', 'str'),
+        ('passport', 'str'),
+        # Room number, 0 if the person has no room
+        ('room', 'int'),
+    ),
+}
+
+
+# ------------------------------------------------------------------
+
+
+def iter_rooms(db: DataBase) -> Iterator[tuple]:
+    for key, room in db.iter_states('rooms'):
+        yield (
+            int(key),
+            room['number'],
+            room['kind'],
+            room['capacity'],
+            room['capacity'] - len(room['occupants']),
+        )
+
+
+def iter_persons(db: DataBase) -> Iterator[tuple]:
+    """Person rows with the room number joined in from a key map."""
+    numbers = {key: room['number'] for key, room in db.iter_states('rooms')}
+
+    for key, person in db.iter_states('persons'):
+        yield (
+            int(key),
+            person['name'],
+            person['gender'],
+            person['age'],
+            person['phone'],
+            person['passport'],
+            numbers.get(person['room'], 0),
+        )
+
+
+ROW_ITERATORS = {'rooms': iter_rooms, 'persons': iter_persons}
+
+
+# ------------------------------------------------------------------
+
+
+def write_csv(filename: str, scheme: tuple, rows: Iterable[tuple]) -> int:
+    count = 0
+
+    with open(filename, 'w', encoding='utf-8', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(name for name, _ in scheme)
+
+        for row in rows:
+            writer.writerow(row)
+            count += 1
+
+    return count
+
+
+def write_jsonl(filename: str, scheme: tuple, rows: Iterable[tuple]) -> int:
+    names = [name for name, _ in scheme]
+    count = 0
+
+    with open(filename, 'w', encoding='utf-8') as f:
+        for row in rows:
+            f.write(json.dumps(dict(zip(names, row)), ensure_ascii=False))
+            f.write('\n')
+            count += 1
+
+    return count
+
+
+def align(offset: int) -> int:
+    return -(-offset // ALIGNMENT) * ALIGNMENT
+
+
+class ColumnWriter:
+    """Streams the values of one column into temporary files."""
+
+    def __init__(self, kind: str) -> None:
+        self.kind = kind
+        self.values = tempfile.TemporaryFile()
+        self.buffer = array('q')
+
+        if kind == 'str':
+            self.data = tempfile.TemporaryFile()
+            self.data_size = 0
+            self.buffer.append(0)
+
+    def add(self, value) -> None:
+        if self.kind == 'str':
+            encoded = value.encode('utf-8')
+            self.data.write(encoded)
+            self.data_size += len(encoded)
+            value = self.data_size
+
+        self.buffer.append(value)
+        if len(self.buffer) >= CHUNK_SIZE:
+            self.flush()
+
+    def flush(self) -> None:
+        self.buffer.tofile(self.values)
+        self.buffer = array('q')
+
+    def get_blocks(self) -> list:
+        """Temporary files making up the column, in file order."""
+        self.flush()
+
+        if self.kind == 'str':
+            return [self.values, self.data]
+
+        return [self.values]
+
+
+def write_columnar(
+    filename: str, scheme: tuple, rows: Iterable[tuple]
+) -> int:
+    columns = [ColumnWriter(kind) for _, kind in scheme]
+    count = 0
+
+    for row in rows:
+        for column, value in zip(columns, row):
+            column.add(value)
+        count += 1
+
+    blocks = [column.get_blocks() for column in columns]
+
+    header = {'rows': count, 'columns': []}
+    offset = 0
+    for (name, kind), column_blocks in zip(scheme, blocks):
+        description = {'name': name, 'type': kind, 'blocks': []}
+        for block in column_blocks:
+            size = block.seek(0, 2)
+            description['blocks'].append([offset, size])
+            offset = align(offset + size)
+        header['columns'].append(description)
+
+    encoded_header = json.dumps(header).encode('utf-8')
+    data_start = align(len(MAGIC) + 8 + len(encoded_header))
+
+    with open(filename, 'wb') as f:
+        f.write(MAGIC)
+        f.write(struct.pack('<Q', len(encoded_header)))
+        f.write(encoded_header)
+
+        for description, column_blocks in zip(header['columns'], blocks):
+            for (block_offset, _), block in zip(
+                description['blocks'], column_blocks
+            ):
+                f.write(b'\0' * (data_start + block_offset - f.tell()))
+                block.seek(0)
+                shutil.copyfileobj(block, f)
+                block.close()
+
+    return count
+
+
+WRITERS = {'.csv': write_csv, '.jsonl': write_jsonl, '.col': write_columnar}
+
+
+# ------------------------------------------------------------------
+
+
+class StringColumn:
+    """Memory-mapped string column of a columnar file."""
+
+    def __init__(self, offsets: memoryview, data: memoryview) -> None:
+        self.offsets = offsets
+        self.data = data
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def __getitem__(self, row: int) -> str:
+        start, end = self.offsets[row], self.offsets[row + 1]
+        return bytes(self.data[start:end]).decode('utf-8')
+
+
+def read_columnar(filename: str) -> dict:
+    """Memory-map a columnar file.
+
+    Returns a dictionary of column name -> int64 memoryview or
+    StringColumn.
+    """
+    with open(filename, 'rb') as f:
+        mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    view = memoryview(mapped)
+    if bytes(view[: len(MAGIC)]) != MAGIC:
+        raise ValueError(f'{filename} is not a columnar export file')
+
+    (header_size,) = struct.unpack_from('<Q', mapped, len(MAGIC))
+    header_start = len(MAGIC) + 8
+    header_end = header_start + header_size
+    header = json.loads(bytes(view[header_start:header_end]))
+    data_start = align(header_end)
+
+    columns = {}
+    for description in header['columns']:
+        blocks = [
+            view[data_start + offset : data_start + offset + size]
+            for offset, size in description['blocks']
+        ]
+
+        if description['type'] == 'str':
+            columns[description['name']] = StringColumn(
+                blocks[0].cast('q'), blocks[1]
+            )
+        else:
+            columns[description['name']] = blocks[0].cast('q')
+
+    return columns
+
+
+# ------------------------------------------------------------------
+
+
+def export_file(part: str, filename: str) -> int:
+    """Export the part to a file, returns the number of rows."""
+    extension = filename[filename.rfind('.') :]
+    writer = WRITERS.get(extension)
+
+    if writer is None:
+        raise ValueError(f'Unknown export format: {extension}')
+
+    rows = ROW_ITERATORS[part](DataBase())
+
+    return writer(filename, SCHEMES[part], rows)
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(
+        description='Экспорт комнат и жильцов в CSV / JSON Lines / .col'
+    )
+    parser.add_argument('part', choices=('rooms', 'persons'))
+    parser.add_argument('filename')
+    parser.add_argument(
+        '--sqlite', action='store_true', help='Использовать базу SQLite'
+    )
+    args = parser.parse_args()
+
+    if args.sqlite:
+        DataBase.STORAGE = 'sqlite'
+
+    count = export_file(args.part, args.filename)
+
+    print(f'Экспортировано: {count}')
+
+
+if __name__ == '__main__':
+    main_cli()
@@ -0,0 +1,242 @@
+"""Streaming bulk import of rooms and persons from CSV / JSON Lines files.
+
+Usage: python -m dorm_accounting.importer {rooms,persons} FILE [--sqlite]
+"""
+
+import argparse
+import csv
+import json
+from itertools import islice
+from typing import Iterable, Iterator
+
+from .database import DataBase
+
+BATCH_SIZE = 5000
+
+ROOM_KINDS = ('m', 'f', 's')
+
+GENDERS = ('m', 'f')
+
+
+class RowError(ValueError):
+    """Invalid import row."""
+
+
+class ImportResult:
+    """Outcome of an import: imported rows and (line, message) errors."""
+
+    def __init__(self) -> None:
+        self.imported = 0
+        self.errors = []
+
+    def add_error(self, line: int, message: str) -> None:
+        self.errors.append((line, message))
+
+
+# ------------------------------------------------------------------
+
+
+def read_rows(filename: str) -> Iterator[tuple]:
+    """Lazily read rows of a .csv or .jsonl file as (line, dictionary)
+    pairs, numbered by their lines in the file.
+
+    A JSON line that is not an object gives a RowError in place of the
+    dictionary, it is reported with the other errors of the import.
+    """
+    with open(filename, 'r', encoding='utf-8-sig', newline='') as f:
+        if filename.endswith('.csv'):
+            reader = csv.DictReader(f)
+            for row in reader:
+                # Line the row ends on, the header is counted
+                yield reader.line_num, row
+            return
+
+        for number, line in enumerate(f, start=1):
+            if line.strip():
+                yield number, parse_json_row(line)
+
+
+def parse_json_row(line: str):
+    """Dictionary of a JSON line, RowError if it is not an object."""
+    try:
+        row = json.loads(line)
+    except json.JSONDecodeError as error:
+        return RowError(f'Неверный JSON: {error.msg}')
+
+    if not isinstance(row, dict):
+        return RowError('Строка должна быть объектом JSON')
+
+    return row
+
+
+def get_int(row: dict, field: str, minimum: int, maximum: int) -> int:
+    try:
+        value = int(row.get(field))
+    except (TypeError, ValueError):
+        raise RowError(f'Поле "{field}" должно быть числом')
+
+    if not minimum <= value <= maximum:
+        raise RowError(
+            f'Поле "{field}" должно быть от {minimum} до {maximum}'
+        )
+
+    return value
+
+
+def get_choice(row: dict, field: str, choices: tuple) -> str:
+    value = str(row.get(field) or '').strip()
+
+    if value not in choices:
+        raise RowError(f'Поле "{field}" должно быть одним из {choices}')
+
+    return value
+
+
+def validate_room(row: dict) -> dict:
+    return {
+        'number': get_int(row, 'number', 1, 2**16),
+        'kind': get_choice(row, 'kind', ROOM_KINDS),
+        'capacity': get_int(row, 'capacity', 0, 99),
+    }
+
+
+def validate_person(row: dict) -> dict:
+    name = str(row.get('name') or '').strip()
+    if not name:
+        raise RowError('Не указано ФИО')
+
+    return {
+        'name': name,
+        'gender': get_choice(row, 'gender', GENDERS),
+        'age': get_int(row, 'age', 0, 120),
+        'phone': str(row.get('phone') or ''),
+        'passport': str(row.get('passport') or ''),
+    }
+
+
+def find_room(db: DataBase, row: dict, gender: str):
+    """Room given by its number in the optional "room" column."""
+    if not row.get('room'):
+        return None
+
+    number = get_int(row, 'room', 1, 2**16)
+    keys = db.lookup('rooms', 'number', number)
+
+    if len(keys) != 1:
+        raise RowError(f'Комната {number} не найдена или не единственна')
+
+    room = db.get_room(keys.pop())
+    if room.kind not in (gender, 's'):
+        raise RowError(f'Жилец не может быть заселён в комнату {number}')
+
+    return room
+
+
+# ------------------------------------------------------------------
+
+
+def import_batch(
+    db: DataBase, part: str, batch: list, result: ImportResult
+) -> None:
+    """Validate a batch of (line, row) pairs and insert the valid rows."""
+    validate = validate_room if part == 'rooms' else validate_person
+
+    params_list = []
+    rooms = []
+
+    for line, row in batch:
+        if isinstance(row, RowError):
+            # Not read as a row, see read_rows
+            result.add_error(line, str(row))
+            continue
+
+        try:
+            params = validate(row)
+            if part == 'persons':
+                rooms.append((line, find_room(db, row, params['gender'])))
+        except RowError as error:
+            result.add_error(line, str(error))
+            continue
+
+        params_list.append(params)
+
+    with db.transaction():
+        keys = db.insert_elements(part, params_list)
+
+        for key, (line, room) in zip(keys, rooms):
+            if room is None:
+                continue
+
+            if room.space <= 0:
+                message = f'В комнате {room.number} нет мест'
+                result.add_error(line, f'{message}, жилец не заселён')
+                continue
+
+            room.add_occupant(key)
+
+    result.imported += len(keys)
+
+
+def import_rows(
+    part: str, rows: Iterable[tuple], batch_size: int = BATCH_SIZE
+) -> ImportResult:
+    """Import (line, row) pairs of the part in batches.
+
+    Indexes of the part are dropped for the import and rebuilt once at the
+    end, also if the import fails. The journal is compacted afterwards.
+    """
+    db = DataBase()
+    result = ImportResult()
+
+    index_names = db.drop_indexes(part)
+
+    try:
+        rows = iter(rows)
+        while True:
+            batch = list(islice(rows, batch_size))
+            if not batch:
+                break
+
+            import_batch(db, part, batch, result)
+    finally:
+        db.build_indexes(part, index_names)
+
+    db.checkpoint()
+
+    return result
+
+
+def import_file(part: str, filename: str) -> ImportResult:
+    """Import a .csv or .jsonl file into the part."""
+    return import_rows(part, read_rows(filename))
+
+
+# ------------------------------------------------------------------
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(
+        description='Импорт комнат и жильцов из CSV / JSON Lines'
+    )
+    parser.add_argument('part', choices=('rooms', 'persons'))
+    parser.add_argument('filename')
+    parser.add_argument(
+        '--sqlite', action='store_true', help='Использовать базу SQLite'
+    )
+    args = parser.parse_args()
+
+    if args.sqlite:
+        DataBase.STORAGE = 'sqlite'
+
+    result = import_file(args.part, args.filename)
+
+    for line, message in result.errors:
+        print(f'Строка {line}: {message}')
+
+    print(f'Импортировано: {result.imported}, ошибок: {len(result.errors)}')
+
+    DataBase().save_data()
+
+
+if __name__ == '__main__':
+    main_cli()
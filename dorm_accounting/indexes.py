@@ -0,0 +1,447 @@
+from bisect import bisect_left, insort
+from itertools import islice
+from typing import Any, Iterable, Iterator
+
+
+class Highest:
+    """Greater than any database key: upper bound of (value, key) pairs."""
+
+    def __lt__(self, other: Any) -> bool:
+        return False
+
+    def __gt__(self, other: Any) -> bool:
+        return True
+
+
+HIGHEST = Highest()
+
+
+class HashIndex:
+    """Equality index: field value -> set of database keys."""
+
+    def __init__(self) -> None:
+        self.values = {}
+
+    def __len__(self) -> int:
+        return sum(map(len, self.values.values()))
+
+    def build(self, items: Iterable[tuple]) -> None:
+        """Fill the index with (key, value) pairs."""
+        for key, value in items:
+            self.add(key, value)
+
+    def add(self, key: str, value: Any) -> None:
+        self.values.setdefault(value, set()).add(key)
+
+    def remove(self, key: str, value: Any) -> None:
+        keys = self.values.get(value)
+        if keys is None:
+            return
+
+        keys.discard(key)
+        if not keys:
+            del self.values[value]
+
+    def find(self, value: Any) -> set:
+        """Keys whose field equals the value."""
+        return set(self.values.get(value, ()))
+
+    def count(self, value: Any) -> int:
+        """Number of keys whose field equals the value."""
+        return len(self.values.get(value, ()))
+
+
+class SortedIndex:
+    """Ordered index of (value, key) pairs.
+
+    Resolves equality, prefix and range lookups with binary search. Pairs
+    are kept in sorted chunks of up to 2 * CHUNK_SIZE pairs, so adding or
+    removing a pair is a binary search plus a move inside one chunk
+    instead of a move of the whole list. Iterating from any position
+    costs O(1) per pair.
+    """
+
+    CHUNK_SIZE = 512
+
+    def __init__(self) -> None:
+        self.chunks = []
+        # Last pair of every chunk
+        self.maxes = []
+        self.size = 0
+
+    def __len__(self) -> int:
+        return self.size
+
+    def __iter__(self) -> Iterator[tuple]:
+        """Iterate (value, key) pairs in order."""
+        for chunk in self.chunks:
+            yield from chunk
+
+    def build(self, items: Iterable[tuple]) -> None:
+        """Fill the index with (key, value) pairs."""
+        entries = list(self)
+        entries.extend((value, key) for key, value in items)
+        entries.sort()
+
+        size = self.CHUNK_SIZE
+        self.chunks = [
+            entries[start : start + size]
+            for start in range(0, len(entries), size)
+        ]
+        self.maxes = [chunk[-1] for chunk in self.chunks]
+        self.size = len(entries)
+
+    def locate(self, entry: tuple) -> tuple:
+        """(chunk, position) of the first pair not less than the entry."""
+        index = bisect_left(self.maxes, entry)
+        if index == len(self.chunks):
+            return index, 0
+
+        return index, bisect_left(self.chunks[index], entry)
+
+    def rank(self, entry: tuple) -> int:
+        """Number of pairs less than the entry."""
+        index, position = self.locate(entry)
+        return sum(map(len, self.chunks[:index])) + position
+
+    def add(self, key: str, value: Any) -> None:
+        entry = (value, key)
+        self.size += 1
+
+        if not self.chunks:
+            self.chunks.append([entry])
+            self.maxes.append(entry)
+            return
+
+        index = min(bisect_left(self.maxes, entry), len(self.chunks) - 1)
+        chunk = self.chunks[index]
+        insort(chunk, entry)
+        self.maxes[index] = chunk[-1]
+
+        if len(chunk) > 2 * self.CHUNK_SIZE:
+            half = chunk[self.CHUNK_SIZE :]
+            del chunk[self.CHUNK_SIZE :]
+            self.chunks.insert(index + 1, half)
+            self.maxes[index] = chunk[-1]
+            self.maxes.insert(index + 1, half[-1])
+
+    def remove(self, key: str, value: Any) -> None:
+        entry = (value, key)
+
+        index, position = self.locate(entry)
+        if index == len(self.chunks):
+            return
+
+        chunk = self.chunks[index]
+        if chunk[position] != entry:
+            return
+
+        del chunk[position]
+        self.size -= 1
+
+        if chunk:
+            self.maxes[index] = chunk[-1]
+        else:
+            del self.chunks[index]
+            del self.maxes[index]
+
+    def iter_from(self, entry: tuple = None) -> Iterator[tuple]:
+        """Iterate pairs not less than the entry (all if None) in order."""
+        index, position = (0, 0) if entry is None else self.locate(entry)
+
+        for chunk in self.chunks[index:]:
+            yield from islice(chunk, position, None)
+            position = 0
+
+    def find(self, value: Any) -> set:
+        """Keys whose field equals the value."""
+        return set(self.iter_range(value, value))
+
+    def find_prefix(self, prefix: str) -> set:
+        """Keys whose (string) field starts with the prefix."""
+        keys = set()
+
+        for value, key in self.iter_from((prefix,)):
+            if not value.startswith(prefix):
+                break
+            keys.add(key)
+
+        return keys
+
+    def iter_range(self, low: Any = None, high: Any = None) -> Iterator[str]:
+        """Iterate keys with low <= value <= high in value order.
+
+        None means the range is open on that side.
+        """
+        start = None if low is None else (low,)
+
+        for value, key in self.iter_from(start):
+            if high is not None and value > high:
+                break
+            yield key
+
+    def find_range(self, low: Any = None, high: Any = None) -> set:
+        """Keys with low <= value <= high."""
+        return set(self.iter_range(low, high))
+
+    def iter_keys(self, reverse: bool = False) -> Iterator[str]:
+        """Iterate all keys in value order."""
+        if not reverse:
+            for _, key in self:
+                yield key
+            return
+
+        for chunk in reversed(self.chunks):
+            for _, key in reversed(chunk):
+                yield key
+
+    def count_range(self, low: Any = None, high: Any = None) -> int:
+        """Number of keys with low <= value <= high."""
+        start = 0 if low is None else self.rank((low,))
+        end = self.size if high is None else self.rank((high, HIGHEST))
+
+        return max(end - start, 0)
+
+    def count_prefix(self, prefix: str) -> int:
+        """Number of keys whose (string) field starts with the prefix."""
+        if not prefix:
+            return self.size
+
+        following = prefix[:-1] + chr(ord(prefix[-1]) + 1)
+
+        return self.rank((following,)) - self.rank((prefix,))
+
+
+class VacancyIndex:
+    """Rooms by kind and free space.
+
+    Values are (kind, space) pairs; every kind has its own sorted index of
+    free space, so rooms with at least k free beds are a binary search away.
+    """
+
+    def __init__(self) -> None:
+        self.kinds = {}
+
+    def __len__(self) -> int:
+        return sum(map(len, self.kinds.values()))
+
+    def build(self, items: Iterable[tuple]) -> None:
+        """Fill the index with (key, (kind, space)) pairs."""
+        for key, value in items:
+            self.add(key, value)
+
+    def add(self, key: str, value: tuple) -> None:
+        kind, space = value
+        self.kinds.setdefault(kind, SortedIndex()).add(key, space)
+
+    def remove(self, key: str, value: tuple) -> None:
+        kind, space = value
+        if kind in self.kinds:
+            self.kinds[kind].remove(key, space)
+
+    def find(self, value: tuple) -> set:
+        """Keys of rooms of the kind with exactly the given free space."""
+        kind, space = value
+        if kind not in self.kinds:
+            return set()
+        return self.kinds[kind].find(space)
+
+    def iter_vacant(self, kinds: Iterable[str], min_space: int = 1):
+        """Iterate keys of rooms of the kinds with enough free space."""
+        for kind in kinds:
+            if kind in self.kinds:
+                yield from self.kinds[kind].iter_range(min_space)
+
+
+class RoomCounters:
+    """Running bed totals of all rooms.
+
+    Values are (kind, capacity, occupied) triples; every add/remove is O(1).
+    """
+
+    def __init__(self) -> None:
+        self.capacity = 0
+        self.occupied = 0
+        self.free = {}
+        self.full = 0
+
+    def build(self, items: Iterable[tuple]) -> None:
+        """Fill the counters with (key, (kind, capacity, occupied)) pairs."""
+        for key, value in items:
+            self.add(key, value)
+
+    def build_groups(self, groups: Iterable[tuple]) -> None:
+        """Fill the counters with (value, number of rooms) pairs."""
+        for value, number in groups:
+            self.count(value, number)
+
+    def count(self, value: tuple, sign: int) -> None:
+        kind, capacity, occupied = value
+        space = capacity - occupied
+
+        self.capacity += sign * capacity
+        self.occupied += sign * occupied
+        self.free[kind] = self.free.get(kind, 0) + sign * space
+        if capacity and space <= 0:
+            self.full += sign
+
+    def add(self, key: str, value: tuple) -> None:
+        self.count(value, 1)
+
+    def remove(self, key: str, value: tuple) -> None:
+        self.count(value, -1)
+
+
+class PersonCounters:
+    """Running number of persons and of persons with no room by gender.
+
+    Values are (gender, housed) pairs; every add/remove is O(1).
+    """
+
+    def __init__(self) -> None:
+        self.total = 0
+        self.unhoused = {}
+
+    def build(self, items: Iterable[tuple]) -> None:
+        """Fill the counters with (key, (gender, housed)) pairs."""
+        for key, value in items:
+            self.add(key, value)
+
+    def build_groups(self, groups: Iterable[tuple]) -> None:
+        """Fill the counters with (value, number of persons) pairs."""
+        for value, number in groups:
+            self.count(value, number)
+
+    def count(self, value: tuple, sign: int) -> None:
+        gender, housed = value
+
+        self.total += sign
+        if not housed:
+            self.unhoused[gender] = self.unhoused.get(gender, 0) + sign
+
+    def add(self, key: str, value: tuple) -> None:
+        self.count(value, 1)
+
+    def remove(self, key: str, value: tuple) -> None:
+        self.count(value, -1)
+
+
+def normalize_text(text: str) -> str:
+    """Case fold the text and treat 'ё' as 'е'."""
+    return text.casefold().replace('ё', 'е')
+
+
+def get_trigrams(text: str) -> set:
+    return {text[i : i + 3] for i in range(len(text) - 2)}
+
+
+class TrigramIndex:
+    """Inverted trigram index for case-insensitive substring search."""
+
+    def __init__(self) -> None:
+        self.trigrams = {}
+        self.texts = {}
+        # Keys of texts too short to have a trigram
+        self.short = set()
+
+    def __len__(self) -> int:
+        return len(self.texts)
+
+    def build(self, items: Iterable[tuple]) -> None:
+        """Fill the index with (key, value) pairs."""
+        for key, value in items:
+            self.add(key, value)
+
+    def add(self, key: str, value: str) -> None:
+        text = self.texts[key] = normalize_text(value)
+
+        trigrams = get_trigrams(text)
+        if not trigrams:
+            self.short.add(key)
+
+        for trigram in trigrams:
+            self.trigrams.setdefault(trigram, set()).add(key)
+
+    def remove(self, key: str, value: str) -> None:
+        text = self.texts.pop(key, None)
+        if text is None:
+            return
+
+        self.short.discard(key)
+
+        for trigram in get_trigrams(text):
+            keys = self.trigrams[trigram]
+            keys.discard(key)
+            if not keys:
+                del self.trigrams[trigram]
+
+    def candidates(self, text: str) -> set:
+        """Keys that may contain the (normalized) text.
+
+        For texts of three and more characters the posting sets of its
+        trigrams are intersected, smallest first. Shorter texts take the
+        union of the trigrams that contain them.
+        """
+        if not text:
+            return set(self.texts)
+
+        if len(text) < 3:
+            keys = {key for key in self.short if text in self.texts[key]}
+            for trigram, trigram_keys in self.trigrams.items():
+                if text in trigram:
+                    keys |= trigram_keys
+            return keys
+
+        postings = []
+        for trigram in get_trigrams(text):
+            keys = self.trigrams.get(trigram)
+            if not keys:
+                return set()
+            postings.append(keys)
+
+        postings.sort(key=len)
+
+        keys = set(postings[0])
+        for trigram_keys in postings[1:]:
+            keys &= trigram_keys
+            if not keys:
+                break
+
+        return keys
+
+    def estimate(self, value: str) -> int:
+        """Upper bound of the number of keys whose text contains the value.
+
+        Texts shorter than a trigram are not estimated: every key counts.
+        """
+        text = normalize_text(value)
+        if len(text) < 3:
+            return len(self.texts)
+
+        return min(
+            len(self.trigrams.get(trigram, ()))
+            for trigram in get_trigrams(text)
+        )
+
+    def find(self, value: str) -> set:
+        """Keys whose text contains the value."""
+        text = normalize_text(value)
+
+        keys = self.candidates(text)
+        if len(text) <= 3:
+            # Candidates of a single trigram (or a part of one) are exact
+            return keys
+
+        return {key for key in keys if text in self.texts[key]}
+
+
+__all__ = [
+    'HashIndex',
+    'PersonCounters',
+    'RoomCounters',
+    'SortedIndex',
+    'TrigramIndex',
+    'VacancyIndex',
+    'get_trigrams',
+    'normalize_text',
+]
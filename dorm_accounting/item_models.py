@@ -0,0 +1,776 @@
+"""Virtualized views of database parts.
+
+The model keeps only the ordered keys of the shown objects; the view
+reads and paints just the rows that are visible.
+"""
+
+from itertools import islice
+
+from PySide6 import QtCore as qc, QtGui as qg
+from PySide6.QtWidgets import (
+    QAbstractItemView as ItemView,
+    QListView as ListView,
+    QStyle as Style,
+    QStyledItemDelegate as Delegate,
+    QTableView as TableView,
+)
+
+from .database import DataBase, Person, Room, SingletonMeta
+from .events import get_keys, UPDATED
+from .query import match_where
+from .styles import get_color
+
+# Shown in place of the room number of a person with no room
+NOT_HOUSED = {'f': 'Не заселена', 'm': 'Не заселён'}
+
+ROOM_TYPES = {'s': 'Общая', 'f': 'Женская', 'm': 'Мужская'}
+
+
+# Fields of the display row of a person, in order
+PERSON_ROW_FIELDS = ('key', 'name', 'room', 'phone', 'gender')
+
+
+class PersonRows(metaclass=SingletonMeta):
+    """Display rows of the persons, joined with their rooms once and
+    dropped by the change events of the persons and rooms involved.
+
+    Shared by all the person views; rows are tuples in the order of
+    PERSON_ROW_FIELDS and must not be changed.
+    """
+
+    def make_row(self, person: Person) -> tuple:
+        room = self.db.get_room(person.room)
+        not_housed = NOT_HOUSED.get(person.gender)
+
+        return (
+            int(person.key) + 1,
+            person.name,
+            room.number if room else not_housed,
+            person.phone,
+            not_housed,
+        )
+
+    def get_row(self, person: Person) -> tuple:
+        row = self.rows.get(person.key)
+
+        if row is None:
+            row = self.rows[person.key] = self.make_row(person)
+
+        return row
+
+    def apply_changes(self, events: list) -> None:
+        """Drop the rows of changed persons and of the persons of updated
+        rooms (room number)."""
+        keys = get_keys(events, 'persons')
+
+        for room_key in get_keys(events, 'rooms', UPDATED):
+            keys |= self.db.lookup('persons', 'room', room_key)
+
+        for key in keys:
+            self.rows.pop(key, None)
+
+    def __init__(self) -> None:
+        self.db = DataBase()
+        self.rows = {}
+
+        # Subscribed before the views that read the rows: they are
+        # dropped before the views are told about the change
+        self.db.subscribe(self.apply_changes)
+
+
+def get_person_row(person: Person) -> tuple:
+    """Display values of a person, see PERSON_ROW_FIELDS."""
+    return PersonRows().get_row(person)
+
+
+def get_room_row(room: Room) -> tuple:
+    """Display values of a room: number, kind, space."""
+    return room.number, ROOM_TYPES.get(room.kind), room.space
+
+
+# ------------------------------------------------------------------
+
+
+class ObjectModel(qc.QAbstractTableModel):
+    """Table of the objects of a database part that match a query."""
+
+    PART = ''
+
+    # Field -> column header
+    COLUMNS = {'key': '№'}
+
+    KEY_ROLE = qc.Qt.UserRole
+    # Value the row color is chosen by
+    STYLE_ROLE = qc.Qt.UserRole + 1
+    # All display values of the row
+    ROW_ROLE = qc.Qt.UserRole + 2
+
+    # Rows appended per event loop turn while the model is filled
+    CHUNK_SIZE = 500
+    # Whether the rows are only read a chunk (page) at a time as the view
+    # scrolls to the end, instead of all in the background
+    PAGED = False
+
+    # ------------------------------------------------------------------
+
+    def get_display_row(self, element) -> tuple:
+        """Values of the columns in order (more may follow)."""
+        return tuple(getattr(element, field) for field in self.COLUMNS)
+
+    def get_style(self, element) -> str:
+        return ''
+
+    def get_element(self, key: str):
+        return DataBase().get_elements(self.PART).get(key)
+
+    # ------------------------------------------------------------------
+
+    def rowCount(self, parent=qc.QModelIndex()) -> int:
+        return 0 if parent.isValid() else len(self.keys)
+
+    def columnCount(self, parent=qc.QModelIndex()) -> int:
+        return 0 if parent.isValid() else len(self.COLUMNS)
+
+    def data(self, index, role=qc.Qt.DisplayRole):
+        if not index.isValid():
+            return None
+
+        key = self.keys[index.row()]
+        if role == self.KEY_ROLE:
+            return key
+
+        if role not in (qc.Qt.DisplayRole, self.STYLE_ROLE, self.ROW_ROLE):
+            return None
+
+        element = self.get_element(key)
+        if element is None:
+            return None
+
+        if role == self.STYLE_ROLE:
+            return self.get_style(element)
+
+        if role == self.ROW_ROLE:
+            return self.get_display_row(element)
+
+        return str(self.get_display_row(element)[index.column()])
+
+    def headerData(self, section, orientation, role=qc.Qt.DisplayRole):
+        if role != qc.Qt.DisplayRole or orientation != qc.Qt.Horizontal:
+            return None
+
+        return list(self.COLUMNS.values())[section]
+
+    # ------------------------------------------------------------------
+
+    def refresh(self) -> None:
+        """Run the query again and reset the model."""
+        if self.PAGED:
+            self.fill_progressively()
+            return
+
+        db = DataBase()
+
+        if self.where:
+            query = db.query(self.PART, self.where, self.order_by)
+            keys = [key for key, _ in query]
+        else:
+            keys = db.get_ordered_keys(self.PART, self.order_by)
+
+        self.set_result(self.where, keys)
+
+    def set_result(self, where: dict, keys: list, rows: dict = None) -> None:
+        """Show the ordered keys of the where query run elsewhere (see
+        workers.BackgroundQuery) and reset the model."""
+        self.beginResetModel()
+
+        self.stop_filling()
+
+        self.where = where
+        self.keys = keys
+        if rows is None:
+            rows = {key: row for row, key in enumerate(keys)}
+        self.rows = rows
+
+        self.endResetModel()
+
+    def fill_progressively(self) -> None:
+        """Reset the model and append the query result in chunks between
+        event loop turns: the first (visible) rows show at once and the
+        UI stays responsive while the rest are read."""
+        self.set_result(self.where, [])
+
+        query = DataBase().query(self.PART, self.where, self.order_by)
+        self.pending = iter(query)
+
+        self.append_chunk()
+
+    def append_chunk(self) -> None:
+        if self.pending is None:
+            return
+
+        chunk = [key for key, _ in islice(self.pending, self.CHUNK_SIZE)]
+
+        if chunk:
+            first = len(self.keys)
+            self.beginInsertRows(
+                qc.QModelIndex(), first, first + len(chunk) - 1
+            )
+
+            self.keys.extend(chunk)
+            rows = enumerate(chunk, first)
+            self.rows.update((key, row) for row, key in rows)
+
+            self.endInsertRows()
+
+        if len(chunk) < self.CHUNK_SIZE:
+            self.pending = None
+            return
+
+        if not self.PAGED:
+            self.chunk_timer.start()
+
+    def canFetchMore(self, parent=qc.QModelIndex()) -> bool:
+        return not parent.isValid() and self.pending is not None
+
+    def fetchMore(self, parent=qc.QModelIndex()) -> None:
+        if not parent.isValid():
+            self.append_chunk()
+
+    def stop_filling(self) -> None:
+        """Drop the rows not appended yet."""
+        self.pending = None
+        self.chunk_timer.stop()
+
+    def refresh_row(self, key: str) -> None:
+        """Repaint the row of the key, if it is shown."""
+        row = self.rows.get(key)
+        if row is None:
+            return
+
+        self.dataChanged.emit(
+            self.index(row, 0), self.index(row, len(self.COLUMNS) - 1)
+        )
+
+    def get_order_value(self, key: str):
+        """Value of the key's object in the order of the rows."""
+        field = self.order_by.lstrip('-')
+
+        if field == 'key':
+            return int(key)
+
+        return getattr(self.get_element(key), field), key
+
+    def is_in_order(self, row: int) -> bool:
+        """Whether the row is still in order with its neighbours."""
+        value = self.get_order_value(self.keys[row])
+        reverse = self.order_by.startswith('-')
+
+        if row > 0:
+            previous = self.get_order_value(self.keys[row - 1])
+            if (previous < value) if reverse else (previous > value):
+                return False
+
+        if row + 1 < len(self.keys):
+            following = self.get_order_value(self.keys[row + 1])
+            if (following > value) if reverse else (following < value):
+                return False
+
+        return True
+
+    def get_changed_keys(self, events: list) -> set:
+        """Keys of the part whose rows may have to change."""
+        return get_keys(events, self.PART)
+
+    def apply_changes(self, events: list) -> None:
+        """Repaint the changed rows; rows are only re-queried when one
+        enters, leaves or moves within the list."""
+        if self.pending is not None:
+            # The rest of the query may have changed, it is read again
+            self.fill_progressively()
+            return
+
+        changed_keys = []
+
+        for key in self.get_changed_keys(events):
+            element = self.get_element(key)
+            matches = element is not None and match_where(self.where, element)
+
+            if (key in self.rows) != matches:
+                self.refresh()
+                return
+
+            if matches:
+                changed_keys.append(key)
+
+        # Only now are all the shown keys known to exist and match: the
+        # order checks read the objects of the neighbour rows
+        for key in changed_keys:
+            if not self.is_in_order(self.rows[key]):
+                self.refresh()
+                return
+
+        for key in changed_keys:
+            self.refresh_row(key)
+
+    def __init__(self, where: dict = None, order_by: str = 'key') -> None:
+        super().__init__()
+
+        self.where = where or {}
+        self.order_by = order_by
+
+        # Shown keys in order and row of every key
+        self.keys = []
+        self.rows = {}
+
+        # Rest of the query while the model is filled, see append_chunk
+        self.pending = None
+
+        timer = self.chunk_timer = qc.QTimer(self)
+        timer.setSingleShot(True)
+        timer.setInterval(0)
+        timer.timeout.connect(self.append_chunk)
+
+        self.fill_progressively()
+
+
+class PersonModel(ObjectModel):
+    PART = 'persons'
+
+    COLUMNS = {
+        'key': '№',
+        'name': 'ФИО',
+        'room': 'Комната',
+        'phone': 'Телефон',
+    }
+
+    def get_display_row(self, element: Person) -> tuple:
+        return self.person_rows.get_row(element)
+
+    def get_style(self, element: Person) -> str:
+        return element.gender
+
+    def get_changed_keys(self, events: list) -> set:
+        """Persons changed and persons of updated rooms (room number)."""
+        keys = super().get_changed_keys(events)
+
+        db = DataBase()
+        for room_key in get_keys(events, 'rooms', UPDATED):
+            keys |= db.lookup('persons', 'room', room_key)
+
+        return keys
+
+    def __init__(self, where: dict = None, order_by: str = 'key') -> None:
+        self.person_rows = PersonRows()
+
+        super().__init__(where, order_by)
+
+
+class PersonPageModel(PersonModel):
+    """Persons read a page at a time as the view scrolls."""
+
+    PAGED = True
+    CHUNK_SIZE = 100
+
+
+class RoomModel(ObjectModel):
+    PART = 'rooms'
+
+    COLUMNS = {
+        'number': 'Номер',
+        'kind': 'Тип комнаты',
+        'space': 'Свободно мест',
+    }
+
+    def get_display_row(self, element: Room) -> tuple:
+        return get_room_row(element)
+
+    def get_style(self, element: Room) -> str:
+        return 'full' if element.space <= 0 else element.kind
+
+
+# ------------------------------------------------------------------
+
+
+class ObjectDelegate(Delegate):
+    """Paints rows in the colors of the item styles of style.css."""
+
+    # Item style -> rule of style.css with the row color
+    STYLE_RULES = {
+        'f': 'PersonItem[gender=f]',
+        'm': 'PersonItem[gender=m]',
+        's': 'RoomCard[style=s]',
+        'full': 'RoomCard[style=full]',
+    }
+    SELECTED_RULE = 'ViewItem[selected=true]'
+
+    PADDING = 6
+    ROW_HEIGHT = 30
+
+    def get_colors(self, index) -> tuple:
+        """Rule of the row style and (background, text color) of the row."""
+        if index.data(ObjectModel.KEY_ROLE) == self.view.selected_key:
+            rule = self.SELECTED_RULE
+        else:
+            style = index.data(ObjectModel.STYLE_ROLE)
+            rule = self.STYLE_RULES.get(style, '')
+
+        background = get_color(rule)
+        text_color = get_color(f'{rule} QLabel', 'color', '#000')
+
+        return rule, background, text_color
+
+    def paint(self, painter, option, index) -> None:
+        _, background, text_color = self.get_colors(index)
+
+        rect = option.rect
+        painter.save()
+        painter.fillRect(rect, qg.QColor(background))
+
+        painter.setPen(qg.QColor(text_color))
+        text_rect = rect.adjusted(self.PADDING, 0, -self.PADDING, 0)
+        text = option.fontMetrics.elidedText(
+            index.data() or '', qc.Qt.ElideRight, text_rect.width()
+        )
+        painter.drawText(text_rect, qc.Qt.AlignLeft | qc.Qt.AlignVCenter, text)
+        painter.restore()
+
+    def sizeHint(self, option, index) -> qc.QSize:
+        size = super().sizeHint(option, index)
+        size.setHeight(self.ROW_HEIGHT)
+        return size
+
+    def __init__(self, view: 'ModelViewMixin') -> None:
+        super().__init__(view)
+
+        self.view = view
+
+
+class RoomCardDelegate(ObjectDelegate):
+    """Paints a room as a card with its data and an occupants button."""
+
+    CARD_SIZE = qc.QSize(164, 124)
+
+    STYLE_RULES = {
+        style: f'RoomCard[style={style}]' for style in ('f', 'm', 's', 'full')
+    }
+
+    MARGIN = 4
+    RADIUS = 10
+    LINE_HEIGHT = 24
+
+    # In the order of the room row (see get_room_row)
+    LABEL_SCHEME = (
+        'Номер: {}',
+        'Тип комнаты: {}',
+        'Свободно мест: {}',
+    )
+
+    BUTTON_TEXT = 'Жильцы'
+    BUTTON_SIZE = qc.QSize(100, 24)
+    BUTTON_FONT_SIZE = 12
+
+    # ------------------------------------------------------------------
+
+    def get_card_rect(self, rect: qc.QRect) -> qc.QRect:
+        margin = self.MARGIN
+        return rect.adjusted(margin, margin, -margin, -margin)
+
+    def get_button_rect(self, rect: qc.QRect) -> qc.QRect:
+        """Occupants button of the card in the item rect."""
+        card = self.get_card_rect(rect)
+        size = self.BUTTON_SIZE
+
+        return qc.QRect(
+            card.center().x() - size.width() // 2,
+            card.bottom() - size.height() - self.MARGIN * 2,
+            size.width(),
+            size.height(),
+        )
+
+    def get_button_state(self, option, index) -> str:
+        """Pseudo-state of the occupants button: '', ':hover' or ':pressed'."""
+        if not option.state & Style.State_MouseOver:
+            return ''
+
+        key = index.data(ObjectModel.KEY_ROLE)
+        if key != self.view.button_key:
+            return ''
+
+        return ':pressed' if self.view.button_pressed else ':hover'
+
+    def paint(self, painter, option, index) -> None:
+        row = index.data(ObjectModel.ROW_ROLE)
+        if row is None:
+            return
+
+        rule, background, text_color = self.get_colors(index)
+        state = self.get_button_state(option, index)
+        button_color = get_color(f'{rule} QPushButton{state}')
+
+        painter.save()
+        painter.setRenderHint(qg.QPainter.Antialiasing)
+
+        card = self.get_card_rect(option.rect)
+        painter.setPen(qg.QPen(qg.QColor('#000'), 2))
+        painter.setBrush(qg.QColor(background))
+        painter.drawRoundedRect(card, self.RADIUS, self.RADIUS)
+
+        painter.setPen(qg.QColor(text_color))
+        for line, (scheme, value) in enumerate(zip(self.LABEL_SCHEME, row)):
+            line_rect = qc.QRect(
+                card.left(),
+                card.top() + self.MARGIN + line * self.LINE_HEIGHT,
+                card.width(),
+                self.LINE_HEIGHT,
+            )
+            painter.drawText(
+                line_rect, qc.Qt.AlignCenter, scheme.format(value)
+            )
+
+        button = self.get_button_rect(option.rect)
+        painter.setPen(qc.Qt.NoPen)
+        painter.setBrush(qg.QColor(button_color))
+        painter.drawRoundedRect(button, self.RADIUS, self.RADIUS)
+
+        font = painter.font()
+        font.setBold(True)
+        font.setPixelSize(self.BUTTON_FONT_SIZE)
+        painter.setFont(font)
+        painter.setPen(qg.QColor('#FFF'))
+        painter.drawText(button, qc.Qt.AlignCenter, self.BUTTON_TEXT)
+
+        painter.restore()
+
+    def sizeHint(self, option, index) -> qc.QSize:
+        return self.CARD_SIZE
+
+
+# ------------------------------------------------------------------
+
+
+class ModelViewMixin:
+    """Interface of ObjectView for the model based views."""
+
+    def update_view(self):
+        self.model().refresh()
+
+    def set_filter(self, where: dict):
+        self.model().where = where
+        self.update_view()
+
+    def set_order_by(self, order_by: str):
+        self.model().order_by = order_by
+
+    def show_result(self, where: dict, order_by: str, keys: list, rows: dict):
+        """Show the result of a query run off the UI thread."""
+        model = self.model()
+
+        model.order_by = order_by
+        model.set_result(where, keys, rows)
+
+    # ------------------------------------------------------------------
+
+    def select_item(self, key):
+        previous_key = self.selected_key
+        self.selected_key = key
+
+        self.model().refresh_row(previous_key)
+        self.model().refresh_row(key)
+
+    def deselect_item(self):
+        self.select_item(None)
+
+    def get_selected_item(self):
+        return self.model().get_element(self.selected_key)
+
+    def emit_clicked(self, index):
+        self.item_clicked.emit(index.data(ObjectModel.KEY_ROLE))
+
+    # ------------------------------------------------------------------
+
+    def showEvent(self, event):
+        DataBase().subscribe(self.model().apply_changes)
+
+        # Changes made while hidden were not applied
+        if self.stale:
+            self.stale = False
+            self.update_view()
+
+        super().showEvent(event)
+
+    def hideEvent(self, event):
+        DataBase().unsubscribe(self.model().apply_changes)
+        self.model().stop_filling()
+        self.stale = True
+
+        super().hideEvent(event)
+
+    # ------------------------------------------------------------------
+
+    def construct_view(self):
+        self.setSelectionMode(ItemView.NoSelection)
+        self.setEditTriggers(ItemView.NoEditTriggers)
+        self.setVerticalScrollMode(ItemView.ScrollPerPixel)
+
+        self.clicked.connect(self.emit_clicked)
+
+    def init_view(self, where: dict = None):
+        self.selected_key = None
+
+        # Rows are not updated while the view is hidden
+        self.stale = False
+
+        self.setModel(self.MODEL(where))
+        self.construct_view()
+
+        # Windows place the view by its scroll area, the view scrolls
+        # itself
+        self.scroll_area = self
+
+
+class ObjectTableView(ModelViewMixin, TableView):
+    """Virtualized list of objects, one table row per object."""
+
+    MODEL = ObjectModel
+
+    COLUMN_WIDTHS = [40]
+
+    item_clicked = qc.Signal(str)
+
+    def construct_view(self):
+        super().construct_view()
+
+        self.setItemDelegate(ObjectDelegate(self))
+        self.setShowGrid(False)
+
+        self.verticalHeader().hide()
+        self.verticalHeader().setDefaultSectionSize(ObjectDelegate.ROW_HEIGHT)
+        self.horizontalHeader().setStretchLastSection(True)
+
+        for column, width in enumerate(self.COLUMN_WIDTHS):
+            self.setColumnWidth(column, width)
+
+    def __init__(self, parent=None, where: dict = None):
+        super().__init__(parent)
+
+        self.init_view(where)
+
+
+class PersonTableView(ObjectTableView):
+    MODEL = PersonModel
+
+    COLUMN_WIDTHS = [60, 300, 150]
+
+
+class PersonPageTableView(PersonTableView):
+    MODEL = PersonPageModel
+
+
+class RoomCardView(ModelViewMixin, ListView):
+    """Virtualized grid of room cards painted by RoomCardDelegate."""
+
+    MODEL = RoomModel
+
+    SPACING = 7
+
+    item_clicked = qc.Signal(str)
+    occupants_clicked = qc.Signal(str)
+
+    def get_button_key(self, pos: qc.QPoint) -> str:
+        """Key of the room whose occupants button is at the position."""
+        index = self.indexAt(pos)
+        if not index.isValid():
+            return None
+
+        button = self.itemDelegate().get_button_rect(self.visualRect(index))
+        if not button.contains(pos):
+            return None
+
+        return index.data(ObjectModel.KEY_ROLE)
+
+    def set_button_state(self, key: str, pressed: bool) -> None:
+        """Repaint the occupants buttons whose hover or press changed."""
+        if (key, pressed) == (self.button_key, self.button_pressed):
+            return
+
+        previous_key = self.button_key
+        self.button_key = key
+        self.button_pressed = pressed
+
+        self.model().refresh_row(previous_key)
+        self.model().refresh_row(key)
+
+    def mouseMoveEvent(self, event):
+        key = self.get_button_key(event.pos())
+        self.set_button_state(key, self.button_pressed and key is not None)
+
+        super().mouseMoveEvent(event)
+
+    def mousePressEvent(self, event):
+        key = self.get_button_key(event.pos())
+        self.set_button_state(key, key is not None)
+
+        super().mousePressEvent(event)
+
+    def mouseReleaseEvent(self, event):
+        key = self.get_button_key(event.pos())
+        pressed = self.button_pressed
+        self.set_button_state(key, False)
+
+        if key is not None and pressed:
+            self.occupants_clicked.emit(key)
+            return
+
+        super().mouseReleaseEvent(event)
+
+    def leaveEvent(self, event):
+        self.set_button_state(None, False)
+
+        super().leaveEvent(event)
+
+    def construct_view(self):
+        super().construct_view()
+
+        self.setItemDelegate(RoomCardDelegate(self))
+
+        self.setViewMode(ListView.IconMode)
+        self.setMovement(ListView.Static)
+        self.setResizeMode(ListView.Adjust)
+        self.setWrapping(True)
+        self.setUniformItemSizes(True)
+        self.setSpacing(self.SPACING)
+
+        # Hover feedback of the occupants buttons
+        self.setMouseTracking(True)
+        self.viewport().setAttribute(qc.Qt.WA_Hover)
+
+    def __init__(self, parent=None, where: dict = None):
+        super().__init__(parent)
+
+        # Room whose occupants button is under the mouse, and whether it
+        # is held down
+        self.button_key = None
+        self.button_pressed = False
+
+        self.init_view(where)
+
+
+__all__ = [
+    'NOT_HOUSED',
+    'PERSON_ROW_FIELDS',
+    'ROOM_TYPES',
+    'ModelViewMixin',
+    'ObjectDelegate',
+    'ObjectModel',
+    'ObjectTableView',
+    'PersonModel',
+    'PersonPageModel',
+    'PersonPageTableView',
+    'PersonRows',
+    'PersonTableView',
+    'RoomCardDelegate',
+    'RoomCardView',
+    'RoomModel',
+    'get_person_row',
+    'get_room_row',
+]
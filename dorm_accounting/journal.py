@@ -0,0 +1,94 @@
+import os
+import pickle
+from typing import Any, Iterator
+
+
+class Journal:
+    """Append-only file of pickled database change records.
+
+    The first frame of the file is a header holding the snapshot generation
+    the journal belongs to. Records of a journal whose generation does not
+    match the loaded snapshot are already folded into it and are ignored.
+    """
+
+    HEADER = 'dorm-journal'
+
+    def __init__(self, filename: str) -> None:
+        self.filename = filename
+        self.file = None
+        self.count = 0
+
+    def __len__(self) -> int:
+        return self.count
+
+    # ------------------------------------------------------------------
+
+    def read(self, generation: int) -> Iterator[Any]:
+        """Read records written for the given snapshot generation.
+
+        A torn tail (left by a crash in the middle of a write) ends the
+        journal. The file is truncated right after the last good record and
+        opened for appending.
+        """
+        if not os.path.exists(self.filename):
+            self.reset(generation)
+            return
+
+        with open(self.filename, 'rb') as f:
+            try:
+                header = pickle.load(f)
+            except Exception:
+                header = None
+
+            if header != (self.HEADER, generation):
+                f.close()
+                self.reset(generation)
+                return
+
+            good_offset = f.tell()
+            count = 0
+
+            while True:
+                try:
+                    record = pickle.load(f)
+                except Exception:
+                    break
+
+                good_offset = f.tell()
+                count += 1
+                yield record
+
+        self.file = open(self.filename, 'r+b')
+        self.file.truncate(good_offset)
+        self.file.seek(good_offset)
+        self.count = count
+
+    def append(self, record: Any) -> None:
+        """Append one record to the journal."""
+        pickle.dump(record, self.file, pickle.HIGHEST_PROTOCOL)
+        self.file.flush()
+        self.count += 1
+
+    def sync(self) -> None:
+        """Force written records to disk."""
+        self.file.flush()
+        os.fsync(self.file.fileno())
+
+    def reset(self, generation: int) -> None:
+        """Drop all records and start a journal for a new generation."""
+        if self.file is None:
+            self.file = open(self.filename, 'wb')
+
+        self.file.seek(0)
+        self.file.truncate()
+        pickle.dump((self.HEADER, generation), self.file)
+        self.sync()
+        self.count = 0
+
+    def close(self) -> None:
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+
+__all__ = ['Journal']
@@ -0,0 +1,77 @@
+import heapq
+from typing import Iterable
+
+
+class KeyAllocator:
+    """Allocator of integer database keys that reuses the lowest free key.
+
+    Free keys below the high-water mark are kept in a min-heap, so allocate
+    and release are O(log n). Keys taken out of order (reserve) are removed
+    from the heap lazily: the free set tells which heap entries are valid.
+    """
+
+    def __init__(self, used: Iterable[int] = ()) -> None:
+        self.rebuild(used)
+
+    def __contains__(self, key: int) -> bool:
+        return key < self.next and key not in self.free_set
+
+    # ------------------------------------------------------------------
+
+    def rebuild(self, used: Iterable[int]) -> None:
+        """Rebuild the allocator from the keys in use in O(n)."""
+        used = set(used)
+
+        self.next = max(used) + 1 if used else 0
+        # Ascending list is already a valid heap
+        self.free = [key for key in range(self.next) if key not in used]
+        self.free_set = set(self.free)
+
+    def allocate(self) -> int:
+        """Take the lowest free key."""
+        free = self.free
+
+        while free:
+            key = heapq.heappop(free)
+            if key in self.free_set:
+                self.free_set.remove(key)
+                return key
+
+        key = self.next
+        self.next += 1
+        return key
+
+    def allocate_many(self, count: int) -> list:
+        """Take the given number of the lowest free keys."""
+        keys = []
+
+        while len(keys) < count and self.free_set:
+            keys.append(self.allocate())
+
+        start = self.next
+        self.next += count - len(keys)
+        keys.extend(range(start, self.next))
+
+        return keys
+
+    def release(self, key: int) -> None:
+        """Return the key to the free keys."""
+        if key not in self:
+            return
+
+        heapq.heappush(self.free, key)
+        self.free_set.add(key)
+
+    def reserve(self, key: int) -> None:
+        """Mark the given key as used."""
+        if key >= self.next:
+            for free_key in range(self.next, key):
+                heapq.heappush(self.free, free_key)
+                self.free_set.add(free_key)
+            self.next = key + 1
+            return
+
+        self.free_set.discard(key)
+
+
+__all__ = ['KeyAllocator']
@@ -0,0 +1,434 @@
+"""Lazy queries over a database part with an index-aware planner.
+
+    db.query(
+        'persons',
+        where={'gender': 'f', 'name': Contains('ива')},
+        order_by='-age',
+        limit=50,
+    )
+
+A plain value in "where" means equality. The planner resolves the most
+selective indexed condition with its index (or walks a sorted index in
+the requested order when only a page is wanted) and checks the other
+conditions on the fetched objects. Query.explain() shows the chosen plan.
+"""
+
+import heapq
+from itertools import islice
+from typing import Any, Iterable, Iterator
+
+from .indexes import HashIndex, normalize_text, SortedIndex, TrigramIndex
+
+
+class Condition:
+    """Condition on the value of a field."""
+
+    # Classes of the indexes the condition is resolved with
+    INDEX_TYPES = ()
+
+    def match(self, value: Any) -> bool:
+        raise NotImplementedError
+
+    def estimate(self, index) -> int:
+        """Number of keys the index would return, None if not usable."""
+        return None
+
+    def fetch(self, index) -> Iterable[str]:
+        raise NotImplementedError
+
+
+class Equals(Condition):
+    INDEX_TYPES = (HashIndex, SortedIndex)
+
+    def __init__(self, value: Any) -> None:
+        self.value = value
+
+    def __repr__(self) -> str:
+        return f'= {self.value!r}'
+
+    def match(self, value: Any) -> bool:
+        return value == self.value
+
+    def estimate(self, index) -> int:
+        if isinstance(index, HashIndex):
+            return index.count(self.value)
+        if isinstance(index, SortedIndex):
+            return index.count_range(self.value, self.value)
+        return None
+
+    def fetch(self, index) -> Iterable[str]:
+        return index.find(self.value)
+
+
+class In(Condition):
+    INDEX_TYPES = (HashIndex, SortedIndex)
+
+    def __init__(self, values: Iterable) -> None:
+        self.values = set(values)
+
+    def __repr__(self) -> str:
+        return f'in {sorted(map(repr, self.values))}'
+
+    def match(self, value: Any) -> bool:
+        return value in self.values
+
+    def estimate(self, index) -> int:
+        counts = [Equals(value).estimate(index) for value in self.values]
+        if None in counts:
+            return None
+        return sum(counts)
+
+    def fetch(self, index) -> Iterable[str]:
+        keys = set()
+        for value in self.values:
+            keys |= index.find(value)
+        return keys
+
+
+class NotIn(Condition):
+    """Value not among the values, checked on fetched objects only."""
+
+    def __init__(self, values: Iterable) -> None:
+        self.values = set(values)
+
+    def __repr__(self) -> str:
+        return f'not in {sorted(map(repr, self.values))}'
+
+    def match(self, value: Any) -> bool:
+        return value not in self.values
+
+
+class Range(Condition):
+    """low <= value <= high, None leaves the side open."""
+
+    INDEX_TYPES = (SortedIndex,)
+
+    def __init__(self, low: Any = None, high: Any = None) -> None:
+        self.low = low
+        self.high = high
+
+    def __repr__(self) -> str:
+        return f'in [{self.low!r}, {self.high!r}]'
+
+    def match(self, value: Any) -> bool:
+        if self.low is not None and value < self.low:
+            return False
+        if self.high is not None and value > self.high:
+            return False
+        return True
+
+    def estimate(self, index) -> int:
+        if isinstance(index, SortedIndex):
+            return index.count_range(self.low, self.high)
+        return None
+
+    def fetch(self, index) -> Iterable[str]:
+        return index.iter_range(self.low, self.high)
+
+
+class Prefix(Condition):
+    INDEX_TYPES = (SortedIndex,)
+
+    def __init__(self, prefix: str) -> None:
+        self.prefix = prefix
+
+    def __repr__(self) -> str:
+        return f'starts with {self.prefix!r}'
+
+    def match(self, value: Any) -> bool:
+        return value.startswith(self.prefix)
+
+    def estimate(self, index) -> int:
+        if isinstance(index, SortedIndex):
+            return index.count_prefix(self.prefix)
+        return None
+
+    def fetch(self, index) -> Iterable[str]:
+        return index.find_prefix(self.prefix)
+
+
+class Contains(Condition):
+    """Case-insensitive substring, "ё" matches "е"."""
+
+    INDEX_TYPES = (TrigramIndex,)
+
+    def __init__(self, text: str) -> None:
+        self.text = text
+        self.normalized = normalize_text(text)
+
+    def __repr__(self) -> str:
+        return f'contains {self.text!r}'
+
+    def match(self, value: Any) -> bool:
+        return self.normalized in normalize_text(value)
+
+    def estimate(self, index) -> int:
+        if isinstance(index, TrigramIndex):
+            return index.estimate(self.text)
+        return None
+
+    def fetch(self, index) -> Iterable[str]:
+        return index.find(self.text)
+
+
+def as_condition(value: Any) -> Condition:
+    if isinstance(value, Condition):
+        return value
+    return Equals(value)
+
+
+def match_where(where: dict, element) -> bool:
+    """Whether the object meets every condition of a query "where"."""
+    return all(
+        as_condition(value).match(getattr(element, field))
+        for field, value in where.items()
+    )
+
+
+# ------------------------------------------------------------------
+
+
+class Query:
+    """Lazy query: iterating it yields (key, object) pairs.
+
+    The plan is chosen when the query is created; objects are read only
+    while the query is iterated. Do not change the part while iterating.
+    """
+
+    # Index names tried for a field: the field itself and its text index
+    INDEX_SUFFIXES = ('', '_text')
+
+    def __init__(
+        self,
+        db,
+        part: str,
+        where: dict = None,
+        order_by: str = None,
+        limit: int = None,
+        offset: int = 0,
+    ) -> None:
+        self.db = db
+        self.part = part
+        self.conditions = {
+            field: as_condition(value)
+            for field, value in (where or {}).items()
+        }
+        self.limit = limit
+        self.offset = offset
+
+        self.reverse = bool(order_by) and order_by.startswith('-')
+        self.order_by = order_by.lstrip('-') if order_by else None
+
+        self.make_plan()
+
+    # ------------------------------------------------------------------
+
+    def get_indexes(self, field: str, condition: Condition) -> list:
+        """(name, index) pairs of the indexes defined on the field that
+        the condition can use; only these are built."""
+        indexes = self.db.INDEXES[self.part]
+        names = [
+            field + suffix
+            for suffix in self.INDEX_SUFFIXES
+            if field + suffix in indexes
+        ]
+
+        return [
+            (name, self.db.get_index(self.part, name))
+            for name in names
+            if issubclass(indexes[name][1], condition.INDEX_TYPES)
+        ]
+
+    def choose_index(self) -> tuple:
+        """(estimate, field, name, index) of the most selective condition."""
+        best = None
+
+        for field, condition in self.conditions.items():
+            if field == 'key':
+                continue
+
+            for name, index in self.get_indexes(field, condition):
+                estimate = condition.estimate(index)
+                if estimate is None:
+                    continue
+
+                if best is None or estimate < best[0]:
+                    best = (estimate, field, name, index)
+
+        return best
+
+    def get_order_index(self) -> str:
+        """Name of the sorted index on the order field, if any; it is only
+        built once the plan walks it."""
+        name = self.order_by
+        indexes = self.db.INDEXES[self.part]
+        if name is None or name not in indexes:
+            return None
+
+        if not issubclass(indexes[name][1], SortedIndex):
+            return None
+
+        return name
+
+    def make_plan(self) -> None:
+        """Choose between a key lookup, an index, an ordered index walk
+        and a full scan."""
+        size = len(self.db.get_elements(self.part))
+
+        self.access = ('scan',)
+        cost = size
+
+        key_condition = self.conditions.get('key')
+        if isinstance(key_condition, (Equals, In)):
+            if isinstance(key_condition, In):
+                keys = key_condition.values
+            else:
+                keys = {key_condition.value}
+            self.access = ('keys', keys)
+            cost = len(keys)
+        else:
+            best = self.choose_index()
+            if best is not None and best[0] < cost:
+                estimate, field, name, index = best
+                self.access = ('index', field, name, index, estimate)
+                cost = estimate
+
+        self.sort_needed = self.order_by is not None
+
+        name = self.get_order_index()
+        if name is not None:
+            # Walking the order index stops once the page is full; with
+            # conditions the expected walk grows with their selectivity
+            walk = size
+            if self.limit is not None:
+                wanted = self.offset + self.limit
+                walk = min(size, wanted * size // max(cost, 1))
+
+            # Fetching and sorting costs about cost * log(cost)
+            if walk <= cost * max(cost.bit_length(), 1):
+                index = self.db.get_index(self.part, name)
+                self.access = ('ordered', name, index)
+                self.sort_needed = False
+
+    def explain(self) -> str:
+        """Human readable plan of the query."""
+        access = self.access
+        kind = access[0]
+
+        if kind == 'keys':
+            steps = [f'{self.part}: lookup of {len(access[1])} keys']
+        elif kind == 'index':
+            _, field, name, _, estimate = access
+            condition = self.conditions[field]
+            steps = [
+                f'{self.part}: index {name} {field} {condition!r} '
+                f'(~{estimate} rows)'
+            ]
+        elif kind == 'ordered':
+            direction = 'descending' if self.reverse else 'ascending'
+            steps = [f'{self.part}: walk index {access[1]} {direction}']
+        else:
+            steps = [f'{self.part}: full scan']
+
+        for field, condition in self.get_filters().items():
+            steps.append(f'filter {field} {condition!r}')
+
+        if self.sort_needed:
+            direction = ' descending' if self.reverse else ''
+            limited = ' (top-k)' if self.limit is not None else ''
+            steps.append(f'sort by {self.order_by}{direction}{limited}')
+
+        if self.limit is not None or self.offset:
+            steps.append(f'offset {self.offset} limit {self.limit}')
+
+        return '\n'.join(steps)
+
+    # ------------------------------------------------------------------
+
+    def get_filters(self) -> dict:
+        """Conditions not resolved by the access path."""
+        resolved = None
+        if self.access[0] == 'index':
+            resolved = self.access[1]
+        elif self.access[0] == 'keys':
+            resolved = 'key'
+
+        return {
+            field: condition
+            for field, condition in self.conditions.items()
+            if field != resolved
+        }
+
+    def iter_candidates(self) -> Iterator[tuple]:
+        db_part = self.db.get_elements(self.part)
+        kind = self.access[0]
+
+        if kind == 'scan':
+            yield from db_part.items()
+            return
+
+        if kind == 'keys':
+            keys = self.access[1]
+        elif kind == 'index':
+            _, field, _, index, _ = self.access
+            keys = self.conditions[field].fetch(index)
+        else:
+            keys = self.access[2].iter_keys(self.reverse)
+
+        for key in keys:
+            element = db_part.get(key)
+            if element is not None:
+                yield key, element
+
+    def get_sort_key(self):
+        field = self.order_by
+
+        if field == 'key':
+            return lambda row: int(row[0])
+
+        return lambda row: (getattr(row[1], field), row[0])
+
+    def __iter__(self) -> Iterator[tuple]:
+        filters = list(self.get_filters().items())
+
+        rows = (
+            (key, element)
+            for key, element in self.iter_candidates()
+            if all(
+                condition.match(getattr(element, field))
+                for field, condition in filters
+            )
+        )
+
+        if self.sort_needed:
+            sort_key = self.get_sort_key()
+
+            if self.limit is not None:
+                select = heapq.nlargest if self.reverse else heapq.nsmallest
+                rows = select(self.offset + self.limit, rows, key=sort_key)
+            else:
+                rows = sorted(rows, key=sort_key, reverse=self.reverse)
+
+        stop = None if self.limit is None else self.offset + self.limit
+
+        return islice(rows, self.offset, stop)
+
+    def keys(self) -> list:
+        return [key for key, _ in self]
+
+    def count(self) -> int:
+        """Number of objects the query yields."""
+        return sum(1 for _ in self)
+
+
+__all__ = [
+    'Condition',
+    'Contains',
+    'Equals',
+    'In',
+    'NotIn',
+    'Prefix',
+    'Query',
+    'Range',
+    'match_where',
+]
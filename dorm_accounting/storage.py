@@ -0,0 +1,533 @@
+import os
+import pickle
+import shutil
+import sqlite3
+from collections.abc import MutableMapping
+from itertools import groupby
+from typing import Iterator
+
+from .journal import Journal
+
+DEFAULT_PASSWORD_HASH = (
+    '5e884898da28047151d0e56f8dc6292773603d0d6aabbdd62a11ef721d1542d8'
+)
+
+
+class Storage:
+    """Base class for the database storage backends.
+
+    A backend loads the database dictionary ({'rooms': ..., 'persons': ...,
+    'password': ...}) and persists change records. A record is a list of
+    (part, key, state) tuples, where state is the object snapshot or None
+    when the object was deleted.
+    """
+
+    def __init__(self, elements: dict) -> None:
+        self.elements = elements
+        self.db = None
+
+    def load(self) -> dict:
+        """Load the database dictionary."""
+        raise NotImplementedError
+
+    def write(self, record: list) -> None:
+        """Persist one change record."""
+        raise NotImplementedError
+
+    def save(self) -> None:
+        """Make sure everything written so far is on disk."""
+
+    def checkpoint(self) -> None:
+        """Compact the stored data."""
+
+    def iter_states(self, part: str) -> Iterator[tuple]:
+        """Iterate (key, state) pairs of the part without caching objects."""
+        for key, element in self.db[part].items():
+            yield key, element.jsonify()
+
+    def count_groups(self, part: str, name: str) -> list:
+        """Count the objects of the part by the value of a counters index.
+
+        Returns (value, number of objects) pairs, or None when the backend
+        cannot count them without loading the objects.
+        """
+        return None
+
+    def set_password(self, pass_hash: str) -> None:
+        """Store the new password hash."""
+        self.db['password'] = pass_hash
+
+    def close(self) -> None:
+        """Release the opened files."""
+
+
+class PickleStorage(Storage):
+    """Pickled snapshot of the whole database plus a change journal."""
+
+    def __init__(
+        self,
+        elements: dict,
+        filename: str,
+        reserve: str,
+        journal: str,
+        checkpoint_interval: int,
+    ) -> None:
+        super().__init__(elements)
+
+        self.filename = filename
+        self.reserve = reserve
+        self.journal = Journal(journal)
+        self.checkpoint_interval = checkpoint_interval
+
+    def load(self) -> dict:
+        if not os.path.exists(self.filename):
+            with open(self.filename, 'wb') as nul_file:
+                pickle.dump({'rooms': {}, 'persons': {}}, nul_file)
+
+        with open(self.filename, 'rb') as f:
+            self.db = pickle.load(f)
+
+        if not self.db.get('password'):
+            self.db['password'] = DEFAULT_PASSWORD_HASH
+
+        for record in self.journal.read(self.db.get('generation', 0)):
+            self.apply_record(record)
+
+        return self.db
+
+    def apply_record(self, record: list) -> None:
+        """Apply a journal record to the loaded data."""
+        for part, key, state in record:
+            if state is None:
+                self.db[part].pop(key, None)
+                continue
+
+            self.db[part][key] = self.elements[part](**state)
+
+    def write(self, record: list) -> None:
+        self.journal.append(record)
+
+        if len(self.journal) >= self.checkpoint_interval:
+            self.checkpoint()
+
+    def save(self) -> None:
+        self.journal.sync()
+
+    def checkpoint(self) -> None:
+        self.db['generation'] = self.db.get('generation', 0) + 1
+
+        temp_filename = self.filename + '.tmp'
+        with open(temp_filename, 'wb') as f:
+            pickle.dump(self.db, f)
+            f.flush()
+            os.fsync(f.fileno())
+
+        os.replace(temp_filename, self.filename)
+        shutil.copyfile(self.filename, self.reserve)
+
+        self.journal.reset(self.db['generation'])
+
+    def set_password(self, pass_hash: str) -> None:
+        super().set_password(pass_hash)
+        self.checkpoint()
+
+    def close(self) -> None:
+        self.journal.close()
+
+
+class SQLiteTable(MutableMapping):
+    """Lazily loaded database part backed by an SQLite table.
+
+    Objects are read on first access and cached, so the same key always
+    gives the same object. Assignments and deletions only touch the cache;
+    rows are written by SQLiteStorage.write when the transaction is committed.
+    """
+
+    def __init__(self, storage: 'SQLiteStorage', part: str) -> None:
+        self.storage = storage
+        self.part = part
+        self.cache = {}
+        self.pending = {}
+
+    def __getitem__(self, key):
+        if key in self.pending:
+            element = self.pending[key]
+            if element is None:
+                raise KeyError(key)
+            return element
+
+        element = self.cache.get(key)
+        if element is None:
+            if not isinstance(key, str) or not key.isdigit():
+                raise KeyError(key)
+
+            element = self.storage.load_element(self.part, int(key))
+            if element is None:
+                raise KeyError(key)
+
+            self.cache[key] = element
+
+        return element
+
+    def __setitem__(self, key, value) -> None:
+        self.pending[key] = value
+        self.cache[key] = value
+
+    def __delitem__(self, key) -> None:
+        self[key]
+        self.pending[key] = None
+        self.cache.pop(key, None)
+
+    def __iter__(self) -> Iterator[str]:
+        query = f'SELECT key FROM {self.part} ORDER BY key'
+        for (key,) in self.storage.connection.execute(query):
+            key = str(key)
+            if key not in self.pending:
+                yield key
+
+        for key, element in list(self.pending.items()):
+            if element is not None:
+                yield key
+
+    def __len__(self) -> int:
+        (count,) = self.storage.connection.execute(
+            f'SELECT COUNT(*) FROM {self.part}'
+        ).fetchone()
+
+        for key, element in self.pending.items():
+            stored = self.storage.has_row(self.part, int(key))
+            count += (element is not None) - stored
+
+        return count
+
+    def items(self):
+        """Iterate all objects, loading the missing ones in one query."""
+        self.storage.load_all(self.part)
+        return super().items()
+
+    def values(self):
+        self.storage.load_all(self.part)
+        return super().values()
+
+    def written(self, key: str) -> None:
+        """Forget the pending change of the key once it is stored."""
+        self.pending.pop(key, None)
+
+
+class SQLiteStorage(Storage):
+    """Database stored in SQLite, read only as far as it is needed.
+
+    Room occupants are not stored separately: they are derived from the
+    room foreign key of the persons table.
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS meta (
+            name TEXT PRIMARY KEY,
+            value TEXT
+        );
+        CREATE TABLE IF NOT EXISTS rooms (
+            key INTEGER PRIMARY KEY,
+            number INTEGER NOT NULL,
+            kind TEXT NOT NULL,
+            capacity INTEGER NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS persons (
+            key INTEGER PRIMARY KEY,
+            room INTEGER REFERENCES rooms (key),
+            name TEXT NOT NULL,
+            gender TEXT NOT NULL,
+            age INTEGER,
+            phone TEXT,
+            passport TEXT
+        );
+        CREATE INDEX IF NOT EXISTS rooms_number ON rooms (number);
+        CREATE INDEX IF NOT EXISTS persons_name ON persons (name);
+        CREATE INDEX IF NOT EXISTS persons_gender ON persons (gender);
+        CREATE INDEX IF NOT EXISTS persons_room ON persons (room);
+    """
+
+    PERSON_COLUMNS = (
+        'key',
+        'room',
+        'name',
+        'gender',
+        'age',
+        'phone',
+        'passport',
+    )
+
+    ROOM_COLUMNS = ('key', 'number', 'kind', 'capacity')
+
+    # part -> counters index name -> query of (*value, number of objects)
+    GROUP_QUERIES = {
+        'rooms': {
+            'counters': """
+                SELECT kind, capacity, occupied, COUNT(*) FROM (
+                    SELECT kind, capacity, (
+                        SELECT COUNT(*) FROM persons WHERE room = rooms.key
+                    ) AS occupied
+                    FROM rooms
+                )
+                GROUP BY kind, capacity, occupied
+            """,
+        },
+        'persons': {
+            'counters': """
+                SELECT gender, room IS NOT NULL, COUNT(*) FROM persons
+                GROUP BY gender, room IS NOT NULL
+            """,
+        },
+    }
+
+    def __init__(
+        self, elements: dict, filename: str, legacy: Storage = None
+    ) -> None:
+        super().__init__(elements)
+
+        self.filename = filename
+        self.legacy = legacy
+        self.connection = None
+
+    # ------------------------------------------------------------------
+
+    def load(self) -> dict:
+        new_file = not os.path.exists(self.filename)
+
+        # Background queries read through the connection on pool threads
+        connection = self.connection = sqlite3.connect(
+            self.filename, check_same_thread=False
+        )
+        connection.execute('PRAGMA journal_mode=WAL')
+        connection.execute('PRAGMA synchronous=NORMAL')
+        connection.executescript(self.SCHEMA)
+
+        self.db = {
+            'rooms': SQLiteTable(self, 'rooms'),
+            'persons': SQLiteTable(self, 'persons'),
+        }
+
+        if (
+            new_file
+            and isinstance(self.legacy, PickleStorage)
+            and os.path.exists(self.legacy.filename)
+        ):
+            self.import_legacy()
+
+        row = connection.execute(
+            "SELECT value FROM meta WHERE name = 'password'"
+        ).fetchone()
+        self.db['password'] = row[0] if row else DEFAULT_PASSWORD_HASH
+
+        return self.db
+
+    def import_legacy(self) -> None:
+        """Copy the data of the previous (pickle) storage into SQLite."""
+        legacy_db = self.legacy.load()
+
+        record = [
+            (part, key, element.snapshot())
+            for part in ('rooms', 'persons')
+            for key, element in legacy_db[part].items()
+        ]
+        self.write(record)
+
+        self.set_password(legacy_db['password'])
+        self.legacy.close()
+
+    # ------------------------------------------------------------------
+
+    def has_row(self, part: str, key: int) -> bool:
+        row = self.connection.execute(
+            f'SELECT 1 FROM {part} WHERE key = ?', (key,)
+        ).fetchone()
+        return row is not None
+
+    def build_element(self, part: str, row: tuple, occupants=None):
+        if part == 'rooms':
+            key, number, kind, capacity = row
+            return self.elements['rooms'](
+                str(key), number, kind, capacity, occupants or []
+            )
+
+        key, room, name, gender, age, phone, passport = row
+        return self.elements['persons'](
+            str(key),
+            name,
+            gender,
+            age,
+            phone,
+            passport,
+            str(room) if room is not None else 0,
+        )
+
+    def load_element(self, part: str, key: int):
+        """Read one object from its table (None if there is no such row)."""
+        columns = self.ROOM_COLUMNS if part == 'rooms' else self.PERSON_COLUMNS
+        row = self.connection.execute(
+            f'SELECT {", ".join(columns)} FROM {part} WHERE key = ?', (key,)
+        ).fetchone()
+
+        if row is None:
+            return None
+
+        occupants = None
+        if part == 'rooms':
+            occupants = [
+                str(person_key)
+                for (person_key,) in self.connection.execute(
+                    'SELECT key FROM persons WHERE room = ? ORDER BY key',
+                    (key,),
+                )
+            ]
+
+        return self.build_element(part, row, occupants)
+
+    def load_all(self, part: str) -> None:
+        """Cache every object of the part that is not cached yet."""
+        table = self.db[part]
+        columns = self.ROOM_COLUMNS if part == 'rooms' else self.PERSON_COLUMNS
+
+        occupants = {}
+        if part == 'rooms':
+            for person_key, room_key in self.connection.execute(
+                'SELECT key, room FROM persons '
+                'WHERE room IS NOT NULL ORDER BY key'
+            ):
+                occupants.setdefault(room_key, []).append(str(person_key))
+
+        for row in self.connection.execute(
+            f'SELECT {", ".join(columns)} FROM {part}'
+        ):
+            key = str(row[0])
+            if key in table.cache or key in table.pending:
+                continue
+
+            table.cache[key] = self.build_element(
+                part, row, occupants.get(row[0])
+            )
+
+    def iter_states(self, part: str) -> Iterator[tuple]:
+        """Stream the rows of the part from a cursor, in key order.
+
+        Room occupants are merged in from a second cursor over the persons
+        ordered by room, so neither table is held in memory. Objects with
+        uncommitted changes are given from the pending ones.
+        """
+        table = self.db[part]
+        columns = self.ROOM_COLUMNS if part == 'rooms' else self.PERSON_COLUMNS
+
+        rows = self.connection.execute(
+            f'SELECT {", ".join(columns)} FROM {part} ORDER BY key'
+        )
+
+        if part == 'rooms':
+            occupants = groupby(
+                self.connection.execute(
+                    'SELECT room, key FROM persons '
+                    'WHERE room IS NOT NULL ORDER BY room, key'
+                ),
+                key=lambda row: row[0],
+            )
+            room_key, persons = next(occupants, (None, ()))
+
+        for row in rows:
+            key = str(row[0])
+            room_occupants = None
+
+            if part == 'rooms':
+                while room_key is not None and room_key < row[0]:
+                    room_key, persons = next(occupants, (None, ()))
+
+                if room_key == row[0]:
+                    room_occupants = [str(person) for _, person in persons]
+
+            if key in table.pending:
+                continue
+
+            element = self.build_element(part, row, room_occupants)
+            yield key, element.jsonify()
+
+        for key, element in list(table.pending.items()):
+            if element is not None:
+                yield key, element.jsonify()
+
+    def count_groups(self, part: str, name: str) -> list:
+        """Count the stored rows with an SQL aggregate.
+
+        Only committed rows are counted: changes of the current
+        transaction reach the counters when it is committed.
+        """
+        query = self.GROUP_QUERIES[part].get(name)
+        if query is None:
+            return None
+
+        groups = []
+        for *value, number in self.connection.execute(query):
+            if part == 'persons':
+                value[1] = bool(value[1])
+            groups.append((tuple(value), number))
+
+        return groups
+
+    # ------------------------------------------------------------------
+
+    def write(self, record: list) -> None:
+        with self.connection:
+            for part, key, state in record:
+                if state is None:
+                    self.connection.execute(
+                        f'DELETE FROM {part} WHERE key = ?', (int(key),)
+                    )
+                elif part == 'rooms':
+                    self.connection.execute(
+                        'INSERT OR REPLACE INTO rooms '
+                        '(key, number, kind, capacity) VALUES (?, ?, ?, ?)',
+                        (
+                            int(key),
+                            state['number'],
+                            state['kind'],
+                            state['capacity'],
+                        ),
+                    )
+                else:
+                    room = state['room']
+                    self.connection.execute(
+                        'INSERT OR REPLACE INTO persons '
+                        '(key, room, name, gender, age, phone, passport) '
+                        'VALUES (?, ?, ?, ?, ?, ?, ?)',
+                        (
+                            int(key),
+                            int(room) if room else None,
+                            state['name'],
+                            state['gender'],
+                            state['age'],
+                            state['phone'],
+                            state['passport'],
+                        ),
+                    )
+
+        for part, key, _ in record:
+            self.db[part].written(key)
+
+    def save(self) -> None:
+        self.connection.commit()
+
+    def checkpoint(self) -> None:
+        self.connection.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+
+    def close(self) -> None:
+        self.connection.close()
+
+    def set_password(self, pass_hash: str) -> None:
+        super().set_password(pass_hash)
+
+        with self.connection:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO meta (name, value) "
+                "VALUES ('password', ?)",
+                (pass_hash,),
+            )
+
+
+__all__ = ['PickleStorage', 'SQLiteStorage', 'SQLiteTable', 'Storage']
@@ -0,0 +1,60 @@
+"""Colors of the application style sheet for the code that paints itself.
+
+The item delegates paint rows and cards instead of styled widgets, so they
+take their colors from the rules of style.css rather than keeping copies:
+
+    get_color('PersonItem[gender=f]')
+    get_color('RoomCard[style=m] QPushButton:hover')
+"""
+
+import functools
+import re
+
+STYLE_SHEET = 'dorm_accounting/style.css'
+
+COMMENT = re.compile(r'/\*.*?\*/', re.DOTALL)
+# Selectors { declarations }
+RULE = re.compile(r'([^{}]+)\{([^{}]*)\}')
+
+
+def read_style_sheet() -> str:
+    with open(STYLE_SHEET, 'r', encoding='UTF-8') as css:
+        return css.read()
+
+
+def parse_rules(style: str) -> dict:
+    """Selector -> {property: value} of the rules of a style sheet.
+
+    Every selector of a comma separated list gets the declarations; a later
+    declaration of the same selector and property wins.
+    """
+    rules = {}
+
+    for selectors, body in RULE.findall(COMMENT.sub('', style)):
+        declarations = {}
+        for declaration in body.split(';'):
+            name, colon, value = declaration.partition(':')
+            if colon:
+                declarations[name.strip()] = value.strip()
+
+        for selector in selectors.split(','):
+            selector = ' '.join(selector.split())
+            rules.setdefault(selector, {}).update(declarations)
+
+    return rules
+
+
+@functools.lru_cache(maxsize=None)
+def get_rules() -> dict:
+    """Rules of the application style sheet, read once."""
+    return parse_rules(read_style_sheet())
+
+
+def get_color(
+    selector: str, name: str = 'background', default: str = '#FFF'
+) -> str:
+    """Color property of a rule of the application style sheet."""
+    return get_rules().get(selector, {}).get(name, default)
+
+
+__all__ = ['STYLE_SHEET', 'get_color', 'parse_rules', 'read_style_sheet']
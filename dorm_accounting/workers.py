@@ -0,0 +1,205 @@
+"""Queries run on QThreadPool workers, results posted to the UI thread.
+
+    querier = BackgroundQuery('persons', parent)
+    querier.finished.connect(view.show_result)
+    querier.start(where={'name': Contains('ива')})
+    querier.start(order_by='-name')
+
+Only the latest started query is reported: starting a query cancels the
+one in flight. A query keeps the where or order of the previous one that
+is not given, so searching and sorting combine.
+
+A query is planned and read on a pool thread under DataBase.lock, so the
+indexes it needs are built there too and the UI stays responsive. A query
+that meets a commit is started again, so the result always matches the
+current data.
+"""
+
+from itertools import islice
+
+from PySide6 import QtCore as qc
+
+from .database import DataBase
+
+
+class QuerySignals(qc.QObject):
+    """Signals of the query tasks, they live in the UI thread so the
+    results are delivered there."""
+
+    # Generation, ordered keys, key -> row
+    done = qc.Signal(int, object, object)
+    # Generation of a query that met a change of the data while reading
+    failed = qc.Signal(int)
+
+
+class QueryTask(qc.QRunnable):
+    """Reads the keys of a query on a pool thread."""
+
+    # Keys read per hold of the database lock, a commit waits for a chunk
+    # at most
+    CHUNK_SIZE = 1000
+
+    def cancel(self) -> None:
+        self.cancelled = True
+
+    def read_keys(self) -> list:
+        """Ordered keys of the query, None if it was cancelled.
+
+        Raises RuntimeError if a commit was made after the query was
+        started.
+        """
+        db = DataBase()
+
+        if not self.where:
+            # Sorted once, then cached until the next commit
+            with db.lock:
+                self.check_version(db)
+                return db.get_ordered_keys(self.part, self.order_by)
+
+        keys = []
+        rows = None
+
+        while True:
+            # The indexes are only walked with the lock held, so commits
+            # come in between the chunks
+            with db.lock:
+                self.check_version(db)
+
+                if rows is None:
+                    # Planning builds the indexes the query uses
+                    query = db.query(self.part, self.where, self.order_by)
+                    rows = iter(query)
+                chunk = [key for key, _ in islice(rows, self.CHUNK_SIZE)]
+
+            if self.cancelled:
+                return None
+
+            keys.extend(chunk)
+            if len(chunk) < self.CHUNK_SIZE:
+                return keys
+
+    def check_version(self, db: DataBase) -> None:
+        if db.version != self.version:
+            raise RuntimeError('The data was changed by a commit')
+
+    def run(self) -> None:
+        try:
+            keys = self.read_keys()
+        except RuntimeError:
+            # The part was changed while it was read
+            if not self.cancelled:
+                self.signals.failed.emit(self.generation)
+            return
+
+        if keys is None:
+            return
+
+        rows = {key: row for row, key in enumerate(keys)}
+
+        if not self.cancelled:
+            self.signals.done.emit(self.generation, keys, rows)
+
+    def __init__(
+        self,
+        signals: QuerySignals,
+        generation: int,
+        part: str,
+        where: dict,
+        order_by: str,
+    ) -> None:
+        super().__init__()
+
+        # The task is kept by BackgroundQuery to be cancelled
+        self.setAutoDelete(False)
+
+        self.signals = signals
+        self.generation = generation
+
+        self.part = part
+        self.where = where
+        self.order_by = order_by
+        # Data version the query was started at
+        self.version = DataBase().version
+
+        self.cancelled = False
+
+
+class BackgroundQuery(qc.QObject):
+    """Runs the latest of a series of queries of a part off the UI thread."""
+
+    # Where, order, ordered keys, key -> row
+    finished = qc.Signal(dict, str, object, object)
+    # Whether a query is running
+    busy = qc.Signal(bool)
+
+    def start(self, where: dict = None, order_by: str = None) -> None:
+        """Run the query, the query in flight is cancelled."""
+        self.cancel()
+
+        self.generation += 1
+        if where is not None:
+            self.where = where
+        if order_by is not None:
+            self.order_by = order_by
+
+        self.task = QueryTask(
+            self.signals,
+            self.generation,
+            self.part,
+            self.where,
+            self.order_by,
+        )
+        self.pool.start(self.task)
+
+        self.busy.emit(True)
+
+    def cancel(self) -> None:
+        if self.task is not None:
+            self.task.cancel()
+            self.task = None
+
+    def on_done(self, generation: int, keys: list, rows: dict) -> None:
+        # Results of cancelled queries may still be queued
+        if generation != self.generation or self.task is None:
+            return
+
+        # A commit came after the last chunk was read, the result is stale
+        if self.task.version != DataBase().version:
+            self.start()
+            return
+
+        self.task = None
+        self.busy.emit(False)
+        self.finished.emit(self.where, self.order_by, keys, rows)
+
+    def on_failed(self, generation: int) -> None:
+        if generation == self.generation and self.task is not None:
+            self.start()
+
+    def __init__(
+        self,
+        part: str,
+        parent=None,
+        where: dict = None,
+        order_by: str = 'key',
+    ) -> None:
+        super().__init__(parent)
+
+        self.part = part
+        self.pool = qc.QThreadPool.globalInstance()
+
+        # Parentless: tasks in flight keep it alive if the parent is gone
+        self.signals = QuerySignals()
+        self.signals.done.connect(self.on_done)
+        self.signals.failed.connect(self.on_failed)
+
+        # Number of the latest query, older results are dropped
+        self.generation = 0
+        self.task = None
+
+        # Latest query, it is shown once the task is done
+        self.where = where or {}
+        self.order_by = order_by
+
+
+__all__ = ['BackgroundQuery']
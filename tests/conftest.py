@@ -0,0 +1,31 @@
+import pytest
+
+from dorm_accounting.database import DataBase
+
+
+def close_database() -> None:
+    db = getattr(DataBase, 'instance', None)
+    if db is None:
+        return
+
+    db.storage.close()
+    del DataBase.instance
+
+
+@pytest.fixture
+def open_db(tmp_path, monkeypatch):
+    """Opens the database in a temporary directory.
+
+    Calling it again closes the database and opens it anew from its files,
+    as a restart of the program would.
+    """
+    monkeypatch.chdir(tmp_path)
+
+    def open_db(storage: str = 'pickle') -> DataBase:
+        close_database()
+        monkeypatch.setattr(DataBase, 'STORAGE', storage)
+        return DataBase()
+
+    yield open_db
+
+    close_database()
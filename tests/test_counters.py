@@ -0,0 +1,54 @@
+from utils import fill, make_room
+
+
+def test_sqlite_counters_match_pickle(open_db, tmp_path, monkeypatch):
+    occupancy = {}
+
+    for storage in ('pickle', 'sqlite'):
+        directory = tmp_path / storage
+        directory.mkdir()
+        monkeypatch.chdir(directory)
+
+        fill(open_db(storage))
+        occupancy[storage] = open_db(storage).get_occupancy()
+
+    assert occupancy['pickle'] == occupancy['sqlite']
+    assert occupancy['sqlite'] == {
+        'capacity': 7,
+        'occupied': 3,
+        'free': {'m': 0, 'f': 1, 's': 3},
+        'full_rooms': 1,
+        'persons': 4,
+        'unhoused': {'m': 0, 'f': 1},
+    }
+
+
+def test_sqlite_counters_load_no_objects(open_db):
+    fill(open_db('sqlite'))
+    db = open_db('sqlite')
+
+    db.get_occupancy()
+
+    assert not db.get_elements('rooms').cache
+    assert not db.get_elements('persons').cache
+
+
+def test_seeded_counters_follow_commits(open_db):
+    fill(open_db('sqlite'))
+    db = open_db('sqlite')
+    db.get_occupancy()
+
+    db.get_room('2').add_occupant('3')
+    db.delete_data('persons', '2')
+    db.create_data('rooms', make_room(104, 'm', 4))
+
+    occupancy = db.get_occupancy()
+
+    # Rebuilt from the objects, as the pickle backend does
+    del db.indexes['rooms']['counters']
+    del db.indexes['persons']['counters']
+    db.storage.count_groups = lambda part, name: None
+
+    assert db.get_occupancy() == occupancy
+    assert occupancy['full_rooms'] == 1
+    assert occupancy['unhoused'] == {'m': 0, 'f': 0}
@@ -0,0 +1,33 @@
+from utils import fill
+
+from dorm_accounting.exporter import iter_persons, iter_rooms
+
+
+def test_backends_export_same_rows(open_db, tmp_path, monkeypatch):
+    rows = {}
+
+    for storage in ('pickle', 'sqlite'):
+        directory = tmp_path / storage
+        directory.mkdir()
+        monkeypatch.chdir(directory)
+
+        fill(open_db(storage))
+        db = open_db(storage)
+        rows[storage] = list(iter_rooms(db)), list(iter_persons(db))
+
+    assert rows['pickle'] == rows['sqlite']
+
+    rooms, persons = rows['sqlite']
+    assert [room[-1] for room in rooms] == [0, 3, 1]
+    assert [person[-1] for person in persons] == [101, 102, 101, 0]
+
+
+def test_sqlite_export_loads_no_objects(open_db):
+    fill(open_db('sqlite'))
+    db = open_db('sqlite')
+
+    list(iter_rooms(db))
+    list(iter_persons(db))
+
+    assert not db.get_elements('rooms').cache
+    assert not db.get_elements('persons').cache
@@ -0,0 +1,68 @@
+import pytest
+
+from dorm_accounting.importer import import_file, import_rows, read_rows
+
+
+def test_csv_lines_count_the_header(tmp_path):
+    path = tmp_path / 'rooms.csv'
+    path.write_text(
+        'number,kind,capacity\n101,m,2\nx,m,2\n\n103,q,2\n', encoding='utf-8'
+    )
+
+    lines = [line for line, _ in read_rows(str(path))]
+
+    assert lines == [2, 3, 5]
+
+
+def test_jsonl_lines_count_blank_lines(tmp_path):
+    path = tmp_path / 'rooms.jsonl'
+    path.write_text('{"number": 1}\n\n{"number": 2}\n', encoding='utf-8')
+
+    lines = [line for line, _ in read_rows(str(path))]
+
+    assert lines == [1, 3]
+
+
+def test_errors_report_file_lines(open_db, tmp_path):
+    open_db()
+    path = tmp_path / 'rooms.csv'
+    path.write_text(
+        'number,kind,capacity\n101,m,2\nx,m,2\n102,q,2\n', encoding='utf-8'
+    )
+
+    result = import_file('rooms', str(path))
+
+    assert result.imported == 1
+    assert [line for line, _ in result.errors] == [3, 4]
+
+
+def test_bad_json_lines_are_errors(open_db, tmp_path):
+    open_db()
+    path = tmp_path / 'rooms.jsonl'
+    path.write_text(
+        '{"number": 101, "kind": "m", "capacity": 2}\n'
+        '{"number": 102,\n'
+        '[102, "m", 2]\n'
+        '{"number": 103, "kind": "f", "capacity": 2}\n',
+        encoding='utf-8',
+    )
+
+    result = import_file('rooms', str(path))
+
+    assert result.imported == 2
+    assert [line for line, _ in result.errors] == [2, 3]
+
+
+def test_failed_import_rebuilds_indexes(open_db):
+    db = open_db()
+    db.get_index('rooms', 'number')
+
+    def rows():
+        yield 2, {'number': 101, 'kind': 'm', 'capacity': 2}
+        raise OSError('read failed')
+
+    with pytest.raises(OSError):
+        import_rows('rooms', rows(), batch_size=1)
+
+    assert set(db.indexes['rooms']) == {'number'}
+    assert db.lookup('rooms', 'number', 101) == {'0'}
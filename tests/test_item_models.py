@@ -0,0 +1,43 @@
+import pytest
+from utils import make_person, make_room
+
+pytest.importorskip('PySide6')
+
+from dorm_accounting.item_models import PersonModel, PersonRows  # noqa: E402
+
+
+@pytest.fixture
+def db(open_db):
+    yield open_db()
+
+    # The rows are kept for the database they were made with
+    if hasattr(PersonRows, 'instance'):
+        del PersonRows.instance
+
+
+class RoommatesFirstModel(PersonModel):
+    """Roommates of a deleted person are checked before it, whatever the
+    order of the set of changed keys."""
+
+    def get_changed_keys(self, events: list) -> list:
+        return sorted(super().get_changed_keys(events), key=int, reverse=True)
+
+
+def test_delete_with_roommate_by_name(db):
+    db.create_data('rooms', make_room(101, 's', 3))
+    for name in ('Борисов', 'Андреев', 'Васильев'):
+        db.create_data('persons', make_person(name))
+
+    db.get_room('0').add_occupant('0')
+    db.get_room('0').add_occupant('1')
+
+    model = RoommatesFirstModel(order_by='name')
+    db.subscribe(model.apply_changes)
+
+    assert model.keys == ['1', '0', '2']
+
+    # Roommate 1 is next to the deleted person 0 in the name order
+    db.delete_data('persons', '0')
+
+    assert model.keys == ['1', '2']
+    assert model.rows == {'1': 0, '2': 1}
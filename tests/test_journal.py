@@ -0,0 +1,124 @@
+import os
+import pickle
+
+from utils import fill, get_state, make_person
+
+from dorm_accounting.database import DataBase
+
+
+def test_replay_after_restart(open_db):
+    db = open_db()
+    fill(db)
+    state = get_state(db)
+
+    db = open_db()
+
+    assert get_state(db) == state
+    assert db.get_room('0').space == 0
+    assert db.get_person('2').room == '0'
+
+
+def test_replayed_keys_are_reused(open_db):
+    db = open_db()
+    fill(db)
+
+    db = open_db()
+    db.create_data('persons', make_person('New'))
+
+    # Key 4 was freed by the deletion
+    assert db.get_person('4').name == 'New'
+
+
+def test_torn_last_record_is_dropped(open_db):
+    db = open_db()
+    fill(db)
+    state = get_state(db)
+
+    db.create_data('persons', make_person('Torn'))
+    size = os.path.getsize(DataBase.JOURNAL)
+    db.storage.close()
+
+    # Crash in the middle of writing the last record
+    with open(DataBase.JOURNAL, 'r+b') as journal:
+        journal.truncate(size - 5)
+
+    db = open_db()
+
+    assert get_state(db) == state
+
+    # The journal goes on after the last good record
+    db.create_data('persons', make_person('After'))
+    state = get_state(db)
+
+    db = open_db()
+
+    assert get_state(db) == state
+
+
+def test_garbage_tail_is_dropped(open_db):
+    db = open_db()
+    fill(db)
+    state = get_state(db)
+    db.storage.close()
+
+    with open(DataBase.JOURNAL, 'ab') as journal:
+        journal.write(pickle.dumps([('persons', '9', None)])[:-3])
+
+    db = open_db()
+
+    assert get_state(db) == state
+
+
+def test_checkpoint_compacts_journal(open_db):
+    db = open_db()
+    fill(db)
+    state = get_state(db)
+
+    db.checkpoint()
+
+    assert len(db.storage.journal) == 0
+
+    db = open_db()
+
+    assert get_state(db) == state
+    assert db.storage.db['generation'] == 1
+
+
+def test_stale_journal_is_ignored(open_db):
+    db = open_db()
+    fill(db)
+    db.create_data('persons', make_person('Deleted later'))
+    db.save_data()
+
+    with open(DataBase.JOURNAL, 'rb') as journal:
+        stale_journal = journal.read()
+
+    db.delete_data('persons', '4')
+    db.checkpoint()
+    state = get_state(db)
+    db.storage.close()
+
+    # Crash after the snapshot was replaced, before the journal was reset
+    with open(DataBase.JOURNAL, 'wb') as journal:
+        journal.write(stale_journal)
+
+    db = open_db()
+
+    assert get_state(db) == state
+    assert db.get_person('4') is None
+    assert len(db.storage.journal) == 0
+
+
+def test_backends_reach_same_state(open_db, tmp_path, monkeypatch):
+    states = {}
+
+    for storage in ('pickle', 'sqlite'):
+        directory = tmp_path / storage
+        directory.mkdir()
+        monkeypatch.chdir(directory)
+
+        fill(open_db(storage))
+        states[storage] = get_state(open_db(storage))
+
+    assert states['pickle'] == states['sqlite']
+    assert states['pickle']['rooms']['0']['occupants'] == ['0', '2']
@@ -0,0 +1,193 @@
+import random
+
+import pytest
+
+from dorm_accounting.query import (
+    Contains,
+    Equals,
+    In,
+    match_where,
+    Prefix,
+    Range,
+)
+
+NAMES = ('Иванов', 'Иваненко', 'Петров', 'Сидорова', 'Семёнов', 'Орлова')
+
+PERSONS = 300
+
+
+@pytest.fixture
+def db(open_db):
+    random.seed(0)
+    db = open_db()
+
+    db.insert_elements(
+        'persons',
+        [
+            {
+                'name': f'{random.choice(NAMES)} {number}',
+                'gender': random.choice('mf'),
+                'age': random.randint(17, 30),
+                'phone': f'+7{random.randrange(100):03}',
+                'passport': f'{number:06}',
+            }
+            for number in range(PERSONS)
+        ],
+    )
+
+    return db
+
+
+def scan(db, where: dict, order_by: str = None, limit=None, offset=0):
+    """Keys the query must give, by a full scan and a sort."""
+    rows = [
+        (key, element)
+        for key, element in db.get_elements('persons').items()
+        if match_where(where, element)
+    ]
+
+    if order_by is None:
+        return sorted(key for key, _ in rows)
+
+    field = order_by.lstrip('-')
+    if field == 'key':
+        rows.sort(key=lambda row: int(row[0]))
+    else:
+        rows.sort(key=lambda row: (getattr(row[1], field), row[0]))
+    if order_by.startswith('-'):
+        rows.reverse()
+
+    stop = None if limit is None else offset + limit
+    return [key for key, _ in rows[offset:stop]]
+
+
+WHERES = [
+    {},
+    {'gender': 'f'},
+    {'gender': Equals('m'), 'age': 20},
+    {'age': In([17, 25, 99])},
+    {'key': In(['3', '7', '1000'])},
+    {'key': '5', 'gender': 'm'},
+    {'age': Range(20, 22)},
+    {'age': Range(None, 18), 'gender': 'f'},
+    {'name': Prefix('Иван')},
+    {'phone': Prefix('+705')},
+    {'name': Contains('ИВА')},
+    {'name': Contains('семе')},
+    {'name': Contains('ов 1'), 'age': Range(low=25)},
+    {'passport': '000042'},
+    {'name': Contains('нет такого')},
+]
+
+
+@pytest.mark.parametrize('where', WHERES, ids=repr)
+def test_conditions_match_scan(db, where):
+    query = db.query('persons', where)
+
+    assert sorted(query.keys()) == scan(db, where)
+    assert query.count() == len(scan(db, where))
+
+
+@pytest.mark.parametrize('where', WHERES[:4] + WHERES[8:11], ids=repr)
+@pytest.mark.parametrize('order_by', ['name', '-age', 'key', '-key'])
+@pytest.mark.parametrize('limit, offset', [(None, 0), (10, 0), (10, 25)])
+def test_ordered_pages_match_scan(db, where, order_by, limit, offset):
+    query = db.query('persons', where, order_by, limit, offset)
+
+    assert query.keys() == scan(db, where, order_by, limit, offset)
+
+
+def test_explain_key_lookup(db):
+    plan = db.query('persons', {'key': In(['1', '2'])}).explain()
+
+    assert plan == 'persons: lookup of 2 keys'
+
+
+def test_explain_most_selective_index(db):
+    where = {'gender': 'f', 'passport': '000042'}
+    plan = db.query('persons', where).explain().splitlines()
+
+    assert plan == [
+        "persons: index passport passport = '000042' (~1 rows)",
+        "filter gender = 'f'",
+    ]
+
+
+def test_explain_text_index(db):
+    plan = db.query('persons', {'name': Contains('петр')}).explain()
+
+    assert plan.startswith('persons: index name_text name contains')
+
+
+def test_explain_unselective_condition_scans(db):
+    # Every person matches, the index would not save anything
+    plan = db.query('persons', {'age': Range(0, 100)}).explain()
+
+    assert plan.splitlines() == [
+        'persons: full scan',
+        'filter age in [0, 100]',
+    ]
+
+
+def test_explain_page_walks_order_index(db):
+    query = db.query('persons', order_by='-name', limit=20)
+
+    assert query.explain().splitlines() == [
+        'persons: walk index name descending',
+        'offset 0 limit 20',
+    ]
+
+
+def test_explain_selective_condition_sorts(db):
+    where = {'passport': In(['000001', '000002'])}
+    query = db.query('persons', where, order_by='name', limit=20)
+
+    access, *steps = query.explain().splitlines()
+
+    assert access.startswith('persons: index passport passport in')
+    assert access.endswith('(~2 rows)')
+    assert steps == ['sort by name (top-k)', 'offset 0 limit 20']
+
+
+@pytest.mark.parametrize('order_by', ['name', '-age', 'key', '-key'])
+def test_ordered_keys_match_scan(db, order_by):
+    assert db.get_ordered_keys('persons', order_by) == scan(db, {}, order_by)
+
+
+def test_ordered_keys_are_cached_per_version(db):
+    keys = db.get_ordered_keys('persons', 'name')
+
+    assert db.get_ordered_keys('persons', 'name') is keys
+
+    db.update_data(
+        'persons', '0', {**db.get_person('0').jsonify(), 'name': 'А'}
+    )
+    keys = db.get_ordered_keys('persons', 'name')
+
+    assert keys[0] == '0'
+    assert keys == scan(db, {}, 'name')
+
+
+def test_ordered_keys_ignore_uncommitted_changes(db):
+    with pytest.raises(RuntimeError):
+        with db.transaction():
+            db.delete_data('persons', '0')
+            keys = db.get_ordered_keys('persons', 'key')
+            raise RuntimeError('delete failed')
+
+    assert keys[0] == '0'
+    assert db.get_ordered_keys('persons', 'key') == scan(db, {}, 'key')
+
+
+def test_plan_builds_only_usable_indexes(db):
+    db.query('persons', {'name': Contains('петр'), 'phone': Prefix('+70')})
+
+    # The trigram index of the name and the sorted one of the phone
+    assert set(db.indexes['persons']) == {'name_text', 'phone'}
+
+
+def test_sorting_plan_does_not_build_order_index(db):
+    query = db.query('persons', {'passport': '000042'}, order_by='name')
+
+    assert query.explain().splitlines()[-1] == 'sort by name'
+    assert 'name' not in db.indexes['persons']
@@ -0,0 +1,44 @@
+import pytest
+
+from dorm_accounting.styles import get_color, parse_rules
+
+STYLES = ('f', 'm', 's', 'full')
+
+
+def test_parse_rules():
+    rules = parse_rules(
+        '/* comment { a: b } */\n'
+        'A, B  QLabel {\n    color: #FFF;\n    background: url(x.png)\n}\n'
+        'A { color: #000 }\n'
+        'A:hover { background: #123 }\n'
+    )
+
+    assert rules == {
+        'A': {'color': '#000', 'background': 'url(x.png)'},
+        'B QLabel': {'color': '#FFF', 'background': 'url(x.png)'},
+        'A:hover': {'background': '#123'},
+    }
+
+
+@pytest.mark.parametrize('style', STYLES)
+@pytest.mark.parametrize('state', ['', ':hover', ':pressed'])
+def test_room_cards_have_colors(style, state):
+    card = get_color(f'RoomCard[style={style}]', default=None)
+    button = get_color(
+        f'RoomCard[style={style}] QPushButton{state}', default=None
+    )
+
+    assert card.startswith('#')
+    assert button.startswith('#')
+
+
+def test_button_states_differ():
+    for rule in ['ViewItem[selected=true]'] + [
+        f'RoomCard[style={style}]' for style in STYLES
+    ]:
+        colors = {
+            get_color(f'{rule} QPushButton{state}')
+            for state in ('', ':hover', ':pressed')
+        }
+
+        assert len(colors) == 3
@@ -0,0 +1,175 @@
+import pytest
+from utils import fill, get_state, make_person, make_room
+
+from dorm_accounting.database import DataBase
+
+
+def get_index_state(db: DataBase) -> dict:
+    return {
+        'housed': db.lookup('persons', 'room', '1'),
+        'vacant': db.find_vacant_rooms('m'),
+        'occupancy': db.get_occupancy(),
+    }
+
+
+@pytest.mark.parametrize('storage', ('pickle', 'sqlite'))
+def test_failed_move_is_rolled_back(open_db, storage):
+    db = open_db(storage)
+    fill(db)
+    state = get_state(db)
+    index_state = get_index_state(db)
+
+    with pytest.raises(RuntimeError):
+        with db.transaction():
+            db.get_room('1').add_occupant('0')
+            raise RuntimeError('move failed')
+
+    assert get_state(db) == state
+    assert get_index_state(db) == index_state
+    assert db.get_room('0').space == 0
+    assert db.get_room('1').space == 3
+    assert db.get_person('0').room == '0'
+
+
+@pytest.mark.parametrize('storage', ('pickle', 'sqlite'))
+def test_rolled_back_delete_keeps_key(open_db, storage):
+    db = open_db(storage)
+    fill(db)
+    state = get_state(db)
+
+    with pytest.raises(RuntimeError):
+        with db.transaction():
+            db.delete_data('persons', '1')
+            raise RuntimeError('delete failed')
+
+    assert get_state(db) == state
+    assert db.get_room('1').occupants == ['1']
+
+    db.create_data('persons', make_person('New'))
+
+    assert db.get_person('1').name == 'Person 1'
+    assert db.get_person('4').name == 'New'
+
+
+@pytest.mark.parametrize('storage', ('pickle', 'sqlite'))
+def test_rolled_back_create_frees_key(open_db, storage):
+    db = open_db(storage)
+    fill(db)
+
+    with pytest.raises(RuntimeError):
+        with db.transaction():
+            db.create_data('persons', make_person('Rolled back'))
+            raise RuntimeError('create failed')
+
+    assert db.get_person('4') is None
+
+    db.create_data('persons', make_person('New'))
+
+    assert db.get_person('4').name == 'New'
+
+
+def test_refused_create_frees_key(open_db):
+    db = open_db()
+    fill(db)
+
+    with pytest.raises(TypeError):
+        db.create_data('persons', {'name': 'No gender'})
+
+    db.create_data('persons', make_person('New'))
+
+    assert db.get_person('4').name == 'New'
+
+
+def test_refused_insert_frees_keys(open_db):
+    db = open_db()
+    fill(db)
+
+    with pytest.raises(TypeError):
+        db.insert_elements(
+            'persons', [make_person('Valid'), {'name': 'No gender'}, {}]
+        )
+
+    params_list = [make_person(f'New {number}') for number in range(3)]
+
+    assert db.insert_elements('persons', params_list) == ['4', '5', '6']
+
+
+@pytest.mark.parametrize('storage', ('pickle', 'sqlite'))
+def test_rolled_back_insert_into_freed_key(open_db, storage):
+    db = open_db(storage)
+    fill(db)
+    state = get_state(db)
+
+    with pytest.raises(RuntimeError):
+        with db.transaction():
+            db.delete_data('persons', '3')
+            keys = db.insert_elements('persons', [make_person('Reused')])
+            raise RuntimeError('insert failed')
+
+    assert keys == ['3']
+    assert get_state(db) == state
+
+
+def test_insert_into_freed_key_updates_indexes(open_db):
+    db = open_db()
+    fill(db)
+    db.build_indexes('persons', ['gender'])
+
+    with db.transaction():
+        db.delete_data('persons', '3')
+        db.insert_elements('persons', [make_person('Reused', 'm')])
+
+    assert db.lookup('persons', 'gender', 'f') == {'1'}
+    assert db.lookup('persons', 'gender', 'm') == {'0', '2', '3'}
+
+
+def test_nested_transactions_commit_once(open_db, monkeypatch):
+    db = open_db()
+    fill(db)
+
+    batches = []
+    db.subscribe(batches.append)
+
+    records = []
+    write = db.storage.write
+    monkeypatch.setattr(
+        db.storage, 'write', lambda record: records.append(write(record))
+    )
+    version = db.version
+
+    with db.transaction():
+        db.create_data('rooms', make_room(104, 'f'))
+        with db.transaction():
+            db.create_data('persons', make_person('Person 5', 'f'))
+            db.get_room('3').add_occupant('4')
+
+        assert not batches
+        assert not records
+
+    assert len(batches) == 1
+    assert len(records) == 1
+    assert db.version == version + 1
+
+    db = open_db()
+
+    assert db.get_room('3').occupants == ['4']
+    assert db.get_person('4').room == '3'
+
+
+def test_index_built_inside_transaction(open_db):
+    db = open_db()
+    fill(db)
+
+    with db.transaction():
+        db.create_data('persons', make_person('Person 5', 'f'))
+        db.delete_data('persons', '2')
+        db.get_room('1').add_occupant('0')
+
+        # Built from the committed states, the commit adds the changes
+        db.build_indexes('persons', ['gender', 'room'])
+        db.build_indexes('rooms', ['vacancy'])
+
+    assert db.lookup('persons', 'gender', 'f') == {'1', '3', '4'}
+    assert db.lookup('persons', 'gender', 'm') == {'0'}
+    assert db.lookup('persons', 'room', '1') == {'0', '1'}
+    assert db.find_vacant_rooms('m') == ['0', '1']
@@ -0,0 +1,46 @@
+from dorm_accounting.database import DataBase
+
+
+def get_state(db: DataBase) -> dict:
+    """Plain data of every object of the database."""
+    return {
+        part: {
+            key: element.snapshot()
+            for key, element in db.get_elements(part).items()
+        }
+        for part in ('rooms', 'persons')
+    }
+
+
+def make_person(name: str, gender: str = 'm') -> dict:
+    return {
+        'name': name,
+        'gender': gender,
+        'age': 20,
+        'phone': '',
+        'passport': '',
+    }
+
+
+def make_room(number: int, kind: str = 's', capacity: int = 2) -> dict:
+    return {'number': number, 'kind': kind, 'capacity': capacity}
+
+
+def fill(db: DataBase) -> None:
+    """Rooms 101 (m), 102 (s) and 103 (f), persons 0 and 2 housed in room
+    101, person 1 in room 102, person 3 not housed; room 102 is updated
+    and person 4 deleted, so every kind of change is made."""
+    db.create_data('rooms', make_room(101, 'm'))
+    db.create_data('rooms', make_room(102, 's', 3))
+    db.create_data('rooms', make_room(103, 'f', 1))
+
+    for number in range(5):
+        gender = 'mf'[number % 2]
+        db.create_data('persons', make_person(f'Person {number}', gender))
+
+    db.get_room('0').add_occupant('0')
+    db.get_room('0').add_occupant('2')
+    db.get_room('1').add_occupant('1')
+
+    db.update_data('rooms', '1', make_room(102, 's', 4))
+    db.delete_data('persons', '4')